@@ -0,0 +1,119 @@
+"""Timings of the in-memory patient indexes on synthetic data
+
+Run from the repository root:
+
+    python -m Modules.bench_index embeddings --patients 60000
+    python -m Modules.bench_index patients --patients 50000
+"""
+
+import sys
+import time
+import pathlib
+import argparse
+import tempfile
+import numpy as np
+from typing import Callable, List
+
+from Modules.embedding_index import EmbeddingIndex
+from Modules.patient_index import PatientIndex
+
+
+def median_ms(func: Callable, repeats: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return 1000 * float(np.median(timings))
+
+
+def bench_embeddings(args) -> List[tuple]:
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.normal(size=(args.patients, args.dim)).astype(np.float32)
+    dirs = [f"/data/dir_{i % args.dirs}" for i in range(args.patients)]
+    keys = [(dirs[i], f"patient_{i:08d}") for i in range(args.patients)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = EmbeddingIndex(tmp, "0" * 64)
+        add_ms = median_ms(lambda: index.add(keys, ["hash"] * len(keys), vectors), 1)
+        query = vectors[0]
+        rows = [
+            ("add", add_ms),
+            (
+                "exact top-10",
+                median_ms(
+                    lambda: index.query(query, k=10, exclude=[keys[0]]), args.repeats
+                ),
+            ),
+            (
+                "exact top-10, one directory",
+                median_ms(
+                    lambda: index.query(query, k=10, dirs=[dirs[0]]), args.repeats
+                ),
+            ),
+        ]
+        lists_ms = median_ms(index.build_lists, 1)
+        rows += [
+            ("build k-means lists", lists_ms),
+            (
+                "approximate top-10, n_probe=8",
+                median_ms(lambda: index.query(query, k=10, n_probe=8), args.repeats),
+            ),
+        ]
+    return rows
+
+
+def bench_patients(args) -> List[tuple]:
+    """Mount and unmount directories whose stems overlap by half"""
+    dirs = [pathlib.Path(f"/data/dir_{i}") for i in range(args.dirs)]
+    stems = [
+        [f"MUSE_{j + i * args.patients // 2:08d}" for j in range(args.patients)]
+        for i in range(args.dirs)
+    ]
+
+    def mount_all() -> PatientIndex:
+        index = PatientIndex()
+        for dir_path, dir_stems in zip(dirs, stems):
+            index.mount(dir_path, dir_stems)
+        return index
+
+    def unmount_first():
+        index = mount_all()
+        start_time = time.perf_counter()
+        index.unmount(dirs[0])
+        return time.perf_counter() - start_time
+
+    unmount_ms = 1000 * float(np.median([unmount_first() for _ in range(args.repeats)]))
+    return [
+        (f"mount {args.dirs} x {args.patients}", median_ms(mount_all, args.repeats)),
+        ("unmount one directory", unmount_ms),
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the patient indexes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    embeddings = commands.add_parser("embeddings", help="EmbeddingIndex add/query.")
+    embeddings.add_argument("--patients", type=int, default=60000)
+    embeddings.add_argument("--dim", type=int, default=128)
+    embeddings.add_argument("--dirs", type=int, default=2)
+    embeddings.add_argument("--repeats", type=int, default=20)
+    embeddings.add_argument("--seed", type=int, default=0)
+    patients = commands.add_parser("patients", help="PatientIndex mount/unmount.")
+    patients.add_argument("--patients", type=int, default=50000)
+    patients.add_argument("--dirs", type=int, default=2)
+    patients.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "embeddings":
+        rows = bench_embeddings(args)
+    else:
+        rows = bench_patients(args)
+    print(f"{'step':<32}{'ms':>10}")
+    for name, elapsed_ms in rows:
+        print(f"{name:<32}{elapsed_ms:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Peak memory of the signal loading and normalization path
+
+Compares the float64 path the app used before (pandas default dtype and a
+normalization that allocates its temporaries) with the float32 path used by
+DataManager and ModelManager now, on synthetic 500x12 recordings. Peaks are
+measured with tracemalloc, which numpy reports its buffers to. The batch path
+is measured on its first call, which allocates the reusable input buffer, and
+again once the buffer is warm. The buffer stays allocated between calls and
+its size is reported below the table. Run from the repository root:
+
+    python -m Modules.bench_memory --batch-size 256
+"""
+
+import sys
+import pathlib
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import Callable
+
+from Modules.data_manager import DataManager
+from Modules.model_manager import ModelManager
+
+
+def legacy_min_max_normalize(data: np.ndarray) -> np.ndarray:
+    """Normalization as it was before the float32 path, for comparison"""
+    min_val, max_val = np.min(data), np.max(data)
+    if max_val - min_val == 0:
+        return np.zeros_like(data, dtype=np.float32)
+    return ((data - min_val) / (max_val - min_val)).astype(np.float32)
+
+
+def peak_kib(func: Callable) -> float:
+    """Peak traced allocation of one call, the result is kept until the end"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return (peak - start) / 1024
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure signal path peak memory.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    recordings = [
+        (rng.normal(scale=100, size=(500, 12))).astype(np.float32)
+        for _ in range(args.batch_size)
+    ]
+    model_manager = ModelManager(str(pathlib.Path("src") / "Models"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = pathlib.Path(tmp) / "recording.csv"
+        np.savetxt(csv_path, recordings[0], delimiter=",", fmt="%.3f")
+        rows = [
+            (
+                "parse one CSV",
+                peak_kib(lambda: pd.read_csv(csv_path, header=None).to_numpy()),
+                peak_kib(lambda: DataManager.read_signal(csv_path)),
+            )
+        ]
+
+    single64 = recordings[0].astype(np.float64)
+    owned = recordings[0].copy()
+    batch64 = [data.astype(np.float64) for data in recordings]
+    legacy_batch_kib = peak_kib(
+        lambda: np.stack([legacy_min_max_normalize(d) for d in batch64])
+    )
+    # The first call allocates the reusable buffer, later calls only write into it
+    rows += [
+        (
+            f"normalize a batch of {args.batch_size}, first",
+            legacy_batch_kib,
+            peak_kib(lambda: model_manager.prepare_batch(recordings)),
+        ),
+        (
+            f"normalize a batch of {args.batch_size}, reused",
+            legacy_batch_kib,
+            peak_kib(lambda: model_manager.prepare_batch(recordings)),
+        ),
+        (
+            "normalize one recording, reused",
+            peak_kib(lambda: legacy_min_max_normalize(single64)[np.newaxis]),
+            peak_kib(lambda: model_manager.prepare_batch(recordings[:1])),
+        ),
+        (
+            "normalize one recording in place",
+            peak_kib(lambda: legacy_min_max_normalize(single64)[np.newaxis]),
+            peak_kib(lambda: ModelManager.prepare_input(owned)),
+        ),
+    ]
+
+    print(f"{'step':<40}{'before KiB':>12}{'after KiB':>12}")
+    for name, before, after in rows:
+        print(f"{name:<40}{before:>12.1f}{after:>12.1f}")
+    print(f"Retained input buffer: {model_manager.input_buffer_bytes() / 1024:.1f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
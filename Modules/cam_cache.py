@@ -0,0 +1,259 @@
+import re
+import json
+import time
+import shutil
+import secrets
+import hashlib
+import pathlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+MOUNT_HASH_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+# Written into each patient directory, identifies it wherever it is mounted
+DATASET_ID_NAME = "Dataset_Id.txt"
+
+_dataset_ids: Dict[pathlib.Path, str] = {}
+
+
+def dataset_id(dir_path: pathlib.Path) -> str:
+    """Identity of a patient directory that survives mounting it elsewhere
+
+    A random id is stored in the directory the first time it is needed.
+    Read-only directories fall back to a hash of the directory name.
+    """
+    dir_path = pathlib.Path(dir_path).resolve()
+    if dir_path in _dataset_ids:
+        return _dataset_ids[dir_path]
+
+    id_path = dir_path / DATASET_ID_NAME
+    try:
+        value = id_path.read_text().strip()
+    except OSError:
+        value = ""
+    if not MOUNT_HASH_PATTERN.fullmatch(value):
+        value = secrets.token_hex(8)
+        try:
+            id_path.write_text(value)
+        except OSError as e:
+            print(f"Failed to save dataset id {id_path}: {e}")
+            value = hashlib.sha256(dir_path.name.encode()).hexdigest()[:16]
+    _dataset_ids[dir_path] = value
+    return value
+
+
+def cam_key(dir_path: pathlib.Path, file_stem: str) -> str:
+    """Key of a recording's Grad-CAM output, "<dataset id>/<file stem>"
+
+    The key does not depend on mount order, on the name shown in the patient
+    list or on the path the directory is mounted from.
+    """
+    return f"{dataset_id(dir_path)}/{file_stem}"
+
+
+class CamCacheManager:
+    """Size-bounded LRU manager for the Grad-CAM output tree
+
+    Every recording's output directory, root/<directory hash>/<file stem>, is
+    tracked with its size on disk and the last time it was produced or
+    viewed. When the tree grows past the quota the least recently used
+    outputs are deleted and on_evict is called with their cam_key. Output of
+    the older flat root/<patient> layout is tracked under the patient name, so
+    it counts toward the quota and is evicted like the rest. With
+    prune_after_pdf, recorded patients keep only their PDF and lose the
+    per-channel images it was built from.
+    """
+
+    INDEX_NAME = "cam_index.json"
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        quota_bytes: int = 2 * 1024**3,
+        on_evict: Optional[Callable[[str], None]] = None,
+        prune_after_pdf: bool = False,
+    ):
+        self.root = pathlib.Path(root)
+        self.quota_bytes = quota_bytes
+        self.on_evict = on_evict
+        self.prune_after_pdf = prune_after_pdf
+        self.index_path = self.root / self.INDEX_NAME
+        self.index: Dict[str, Dict[str, float]] = {}
+        self._load_index()
+        self.scan()
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except Exception as e:
+            print(f"Failed to load Grad-CAM index {self.index_path}: {e}")
+
+    def _save_index(self):
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.index, f)
+            tmp_path.replace(self.index_path)
+        except OSError as e:
+            print(f"Failed to save Grad-CAM index {self.index_path}: {e}")
+
+    @staticmethod
+    def _dir_size(path: pathlib.Path) -> int:
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+    def patient_dir(self, key: str) -> pathlib.Path:
+        return self.root / key
+
+    def pdf_path(self, key: str) -> pathlib.Path:
+        patient_dir = self.patient_dir(key)
+        return patient_dir / f"{patient_dir.name}.pdf"
+
+    def has_pdf(self, key: str) -> bool:
+        return self.pdf_path(key).exists()
+
+    def scan(self):
+        """Sync the index with the directories that exist on disk"""
+        existing = {}
+        top_dirs = self.root.iterdir() if self.root.exists() else []
+        for top_dir in top_dirs:
+            if not top_dir.is_dir():
+                continue
+            if not MOUNT_HASH_PATTERN.fullmatch(top_dir.name):
+                # Flat root/<patient> output from before the per-directory layout
+                existing[top_dir.name] = top_dir
+                continue
+            for path in top_dir.iterdir():
+                if path.is_dir() and not path.name.startswith("channel_"):
+                    existing[f"{top_dir.name}/{path.name}"] = path
+        for key in list(self.index):
+            if key not in existing:
+                del self.index[key]
+        for key, path in existing.items():
+            if key not in self.index:
+                self.index[key] = {
+                    "size": self._dir_size(path),
+                    "last_access": path.stat().st_mtime,
+                }
+        self._save_index()
+
+    def adopt_legacy(self, dir_path: pathlib.Path, file_stems: Iterable[str]) -> int:
+        """Move output of older layouts into a freshly mounted directory's tree
+
+        Flat root/<patient> output whose name is one of file_stems, and output
+        keyed on the directory's path hash, are renamed to their cam_key.
+        Outputs whose new location already exists are left alone, the quota
+        evicts them eventually. Returns the number of outputs moved.
+        """
+        mount_key = dataset_id(dir_path)
+        resolved = str(pathlib.Path(dir_path).resolve())
+        path_key = hashlib.sha256(resolved.encode()).hexdigest()[:16]
+        file_stems = set(file_stems)
+        moves = [
+            (key, f"{mount_key}/{key.partition('/')[2] or key}")
+            for key in list(self.index)
+            if (key.startswith(f"{path_key}/") and path_key != mount_key)
+            or ("/" not in key and key in file_stems)
+        ]
+
+        moved = 0
+        for old_key, new_key in moves:
+            new_dir = self.patient_dir(new_key)
+            if new_dir.exists():
+                continue
+            try:
+                new_dir.parent.mkdir(parents=True, exist_ok=True)
+                self.patient_dir(old_key).rename(new_dir)
+            except OSError as e:
+                print(f"Failed to move Grad-CAM output {old_key}: {e}")
+                continue
+            self.index[new_key] = self.index.pop(old_key)
+            moved += 1
+
+        if moved:
+            try:
+                self.patient_dir(path_key).rmdir()
+            except OSError:
+                pass
+            self._save_index()
+        return moved
+
+    def total_size(self) -> int:
+        return int(sum(entry["size"] for entry in self.index.values()))
+
+    def touch(self, key: str):
+        if key in self.index:
+            self.index[key]["last_access"] = time.time()
+            self._save_index()
+
+    def record(self, key: str) -> List[str]:
+        """Track freshly generated output and evict others if over quota"""
+        path = self.patient_dir(key)
+        if not path.exists():
+            return []
+
+        if self.prune_after_pdf:
+            self.prune_intermediates(key)
+        self.index[key] = {
+            "size": self._dir_size(path),
+            "last_access": time.time(),
+        }
+        self._save_index()
+        return self.enforce_quota(exclude=[key])
+
+    def prune_intermediates(self, key: str) -> int:
+        """Delete everything but the PDF once it exists, returns bytes freed"""
+        if not self.has_pdf(key):
+            return 0
+
+        freed = 0
+        pdf_path = self.pdf_path(key)
+        for path in self.patient_dir(key).iterdir():
+            if path == pdf_path:
+                continue
+            try:
+                if path.is_dir():
+                    freed += self._dir_size(path)
+                    shutil.rmtree(path)
+                else:
+                    freed += path.stat().st_size
+                    path.unlink()
+            except OSError as e:
+                print(f"Failed to remove {path}: {e}")
+
+        if key in self.index:
+            self.index[key]["size"] = pdf_path.stat().st_size
+            self._save_index()
+        return freed
+
+    def evict(self, key: str):
+        patient_dir = self.patient_dir(key)
+        shutil.rmtree(patient_dir, ignore_errors=True)
+        if patient_dir.parent != self.root:
+            try:
+                patient_dir.parent.rmdir()
+            except OSError:
+                pass
+        self.index.pop(key, None)
+        self._save_index()
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def enforce_quota(self, exclude: Iterable[str] = ()) -> List[str]:
+        """Evict least recently used patients until the tree fits the quota"""
+        exclude = set(exclude)
+        candidates = sorted(
+            (p for p in self.index if p not in exclude),
+            key=lambda p: self.index[p]["last_access"],
+        )
+        evicted = []
+        total = self.total_size()
+        for key in candidates:
+            if total <= self.quota_bytes:
+                break
+            total -= self.index[key]["size"]
+            self.evict(key)
+            evicted.append(key)
+        return evicted
@@ -0,0 +1,30 @@
+import traceback
+from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
+
+
+class CamReconcileWorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+
+class CamReconcileWorker(QRunnable):
+    """Worker class resetting Grad flags whose output is gone, off the main loop"""
+
+    def __init__(self, data_manager, cam_cache, dir_path):
+        super().__init__()
+        self.data_manager = data_manager
+        self.cam_cache = cam_cache
+        self.dir_path = dir_path
+
+        self.signals = CamReconcileWorkerSignals()
+
+    def run(self):
+        try:
+            reset = self.data_manager.reconcile_grad(
+                self.dir_path, self.cam_cache.has_pdf
+            )
+            self.signals.finished.emit(reset)
+        except Exception as e:
+            print(f"Grad-CAM reconciliation error: {e}")
+            print(f"Traceback: {traceback.format_exc()}")
+            self.signals.error.emit(str(e))
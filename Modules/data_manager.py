@@ -2,19 +2,40 @@ import pathlib
 import numpy as np
 import pandas as pd
 from PIL import Image
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Modules.prediction_cache import file_hash
+from Modules.diagnostics_store import DiagnosticsStore, open_diagnostics_store
+from Modules.preprocessing import SignalPreprocessor, read_sampling_rate
+from Modules.long_recording import (
+    LongRecording,
+    is_long_recording,
+    open_long_recording,
+)
+from Modules.quality_scan import QualityIndex
+from Modules.execution_profile import default_profiles
+from Modules.patient_index import PatientIndex
+from Modules.cam_cache import cam_key, dataset_id
 
 
 class DataManager:
     """Manages patient data, labels, and diagnostics"""
 
-    def __init__(self):
-        self.all_patients: List[str] = []
-        self.patient_dir_map: Dict[str, pathlib.Path] = {}
+    def __init__(
+        self,
+        diagnostics_backend: str = "xlsx",
+        preprocessor: Optional[SignalPreprocessor] = None,
+        long_recording_dir: Optional[pathlib.Path] = None,
+        long_recording_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.patient_index = PatientIndex()
         self.label_map_dfs: Dict[pathlib.Path, pd.DataFrame] = {}
-        self.diagnostics_map: Dict[pathlib.Path, pd.DataFrame] = {}
-        self.diagnostics_file_map: Dict[pathlib.Path, pathlib.Path] = {}
-        self.mounted_dirs: List[pathlib.Path] = []
+        self.diagnostics_backend = diagnostics_backend
+        self.diagnostics_map: Dict[pathlib.Path, DiagnosticsStore] = {}
+        self.preprocessor = preprocessor
+        self.long_recording_dir = long_recording_dir
+        self.long_recording_bytes = long_recording_bytes
+        self.quality_map: Dict[str, List[str]] = {}
         self.label_map = {
             0: "Atrial Fibrillation (AFIB)",
             1: "Generic Supraventricular Tachycardia (GSVT)",
@@ -22,34 +43,88 @@ class DataManager:
             3: "Sinus Rhythm (SR)",
         }
 
-    def add_directory(self, dir_path: pathlib.Path) -> tuple[bool, str]:
+    @property
+    def all_patients(self) -> List[str]:
+        """Patient references of every mounted directory, sorted"""
+        return self.patient_index.patients
+
+    @property
+    def mounted_dirs(self) -> List[pathlib.Path]:
+        return self.patient_index.mounted_dirs
+
+    def add_directory(
+        self, dir_path: pathlib.Path, scan_quality: bool = False
+    ) -> tuple[bool, str]:
         dir_path = dir_path.resolve()
 
-        if dir_path in self.mounted_dirs:
+        if dir_path in self.patient_index.dir_refs:
             return False, f"Directory '{dir_path}' already added"
 
+        patient_files = list(dir_path.glob("*.csv"))
+        if not patient_files:
+            return False, "No .csv files found in directory"
+
         label_success, label_msg = self._load_label_map(dir_path)
         if not label_success:
             return False, label_msg
 
         self._load_diagnostics(dir_path)
 
-        patient_files = list(dir_path.glob("*.csv"))
-        if not patient_files:
-            return False, "No .csv files found in directory"
+        patient_ids = [file.stem for file in patient_files]
+        refs = self.patient_index.mount(dir_path, patient_ids)
+        renamed = len(set(refs) - set(patient_ids))
 
-        new_patients = []
-        for file in patient_files:
-            patient_name = file.stem
-            if patient_name not in self.patient_dir_map:
-                new_patients.append(patient_name)
-                self.patient_dir_map[patient_name] = dir_path
+        if scan_quality:
+            self.scan_quality(dir_path)
 
-        self.all_patients.extend(new_patients)
-        self.all_patients = sorted(set(self.all_patients))
-        self.mounted_dirs.append(dir_path)
+        message = f"Added {len(refs)} patients"
+        if renamed:
+            label = self.patient_index.mount_labels[dir_path]
+            message += f", {renamed} already mounted names are listed as <name>@{label}"
+        return True, message
 
-        return True  # , f"Added {len(new_patients)} patients"
+    def remove_directory(self, dir_path: pathlib.Path) -> List[str]:
+        """Unmount one directory, returns the references of its patients"""
+        dir_path = dir_path.resolve()
+        refs = self.patient_index.unmount(dir_path)
+        self.label_map_dfs.pop(dir_path, None)
+        store = self.diagnostics_map.pop(dir_path, None)
+        if store is not None:
+            store.close()
+        for ref in refs:
+            self.quality_map.pop(ref, None)
+        return refs
+
+    def scan_quality(self, dir_path: pathlib.Path) -> Dict[str, List[str]]:
+        """Run the multi-process quality pass over a mounted directory
+
+        The scan runs with the background profile, so it stays off the cores
+        the UI and interactive predictions use.
+        """
+        dir_path = dir_path.resolve()
+        try:
+            flags = QualityIndex(dir_path).scan(
+                expected_length=None if self.preprocessor else 500,
+                max_bytes=(
+                    self.long_recording_bytes if self.long_recording_dir else None
+                ),
+                profile=default_profiles()["background"],
+            )
+        except Exception as e:
+            print(f"Quality scan failed for {dir_path}: {e}")
+            return {}
+
+        # Key flags by reference, the directory may be unmounted meanwhile
+        flags = {
+            self.patient_index.ref(dir_path, patient_id): patient_flags
+            for patient_id, patient_flags in flags.items()
+        }
+        flags.pop(None, None)
+        self.quality_map.update(flags)
+        return flags
+
+    def get_patient_quality(self, patient_id: str) -> Optional[List[str]]:
+        return self.quality_map.get(patient_id)
 
     def _load_label_map(self, dir_path: pathlib.Path) -> tuple[bool, str]:
         label_path = dir_path / "Label_Map.xlsx"
@@ -64,95 +139,241 @@ class DataManager:
             return False, f"Failed to load label map: {e}"
 
     def _load_diagnostics(self, dir_path: pathlib.Path):
-        diag_path = dir_path / "Diagnostics.xlsx"
-        if diag_path.exists():
-            try:
-                diag_df = pd.read_excel(diag_path)
-                self.diagnostics_map[dir_path] = diag_df
-                self.diagnostics_file_map[dir_path] = diag_path
-            except Exception as e:
-                print(f"Failed to load diagnostics from {diag_path}: {e}")
+        try:
+            store = open_diagnostics_store(dir_path, self.diagnostics_backend)
+            if store is not None:
+                self.diagnostics_map[dir_path] = store
+        except Exception as e:
+            print(f"Failed to load diagnostics from {dir_path}: {e}")
+
+    def _patient_path(self, patient_id: str) -> Optional[pathlib.Path]:
+        key = self.patient_index.resolve(patient_id)
+        if key is None:
+            return None
+        dir_path, file_stem = key
+        return dir_path / f"{file_stem}.csv"
+
+    def get_patient_dir(self, patient_id: str) -> Optional[pathlib.Path]:
+        key = self.patient_index.resolve(patient_id)
+        return None if key is None else key[0]
 
     def get_patient_data(self, patient_id: str) -> Optional[np.ndarray]:
-        if patient_id not in self.patient_dir_map:
+        data_path = self._patient_path(patient_id)
+        if data_path is None:
             return None
 
-        data_path = self.patient_dir_map[patient_id] / f"{patient_id}.csv"
-        if not data_path.exists():
+        if not data_path.exists() or self.is_long_recording(patient_id):
             return None
 
+        data = self.read_signal(data_path)
+        if data is None or not self._needs_preprocessing(data):
+            return data
+
         try:
-            df = pd.read_csv(data_path, header=None)
+            return self.preprocessor.transform_cached(
+                data, file_hash(data_path), self.get_sampling_rate(patient_id)
+            )
+        except Exception as e:
+            print(f"Failed to preprocess recording {data_path}: {e}")
+            return None
+
+    def is_long_recording(self, patient_id: str) -> bool:
+        data_path = self._patient_path(patient_id)
+        if self.long_recording_dir is None or data_path is None:
+            return False
+
+        return is_long_recording(data_path, self.long_recording_bytes)
+
+    def get_long_recording(self, patient_id: str) -> Optional[LongRecording]:
+        if not self.is_long_recording(patient_id):
+            return None
+
+        data_path = self._patient_path(patient_id)
+        return open_long_recording(
+            data_path, self.long_recording_dir, self.get_sampling_rate(patient_id)
+        )
+
+    def get_patients_data(self, patient_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Load several recordings, preprocessing the raw ones in one batch"""
+        loaded = {}
+        for patient_id in patient_ids:
+            data_path = self._patient_path(patient_id)
+            if data_path is None or self.is_long_recording(patient_id):
+                continue
+            data = self.read_signal(data_path)
+            if data is not None:
+                loaded[patient_id] = data
+
+        raw_ids = [p for p, data in loaded.items() if self._needs_preprocessing(data)]
+        if raw_ids:
+            processed = self.preprocessor.transform_many(
+                [loaded[p] for p in raw_ids],
+                [self.get_sampling_rate(p) for p in raw_ids],
+            )
+            loaded.update(zip(raw_ids, processed))
+        return loaded
+
+    def get_sampling_rate(self, patient_id: str) -> float:
+        """Sampling rate from the recording's .hea header, else the default"""
+        data_path = self._patient_path(patient_id)
+        sampling_rate = read_sampling_rate(data_path) if data_path else None
+        if sampling_rate is not None:
+            return sampling_rate
+        return self.preprocessor.sampling_rate if self.preprocessor else 500.0
+
+    def get_preprocessing_config(self, patient_id: str) -> str:
+        """Fingerprint of the preprocessing a raw recording is read with"""
+        if self.preprocessor is None:
+            return ""
+        return self.preprocessor.fingerprint(self.get_sampling_rate(patient_id))
+
+    def _needs_preprocessing(self, data: np.ndarray) -> bool:
+        return self.preprocessor is not None and self.preprocessor.needs_preprocessing(
+            data
+        )
+
+    def get_patient_key(self, patient_id: str) -> Optional[Tuple[str, str]]:
+        """(directory, patient) key identifying a recording across mounts"""
+        key = self.patient_index.resolve(patient_id)
+        if key is None:
+            return None
+        return str(key[0]), key[1]
+
+    def get_patient_ref(self, dir_path, file_stem: str) -> Optional[str]:
+        """Reference of a mounted (directory, patient) key"""
+        return self.patient_index.ref(pathlib.Path(dir_path), file_stem)
+
+    def get_cam_key(self, patient_id: str) -> Optional[str]:
+        """Grad-CAM output key, stable across mounts unlike the reference"""
+        key = self.patient_index.resolve(patient_id)
+        return None if key is None else cam_key(*key)
+
+    def get_patient_by_cam_key(self, key: str) -> Optional[str]:
+        """Reference of the mounted recording a Grad-CAM output belongs to"""
+        mount_key, _, file_stem = key.partition("/")
+        for dir_path in self.mounted_dirs:
+            if dataset_id(dir_path) == mount_key:
+                return self.patient_index.ref(dir_path, file_stem)
+        return None
+
+    def get_patient_hash(self, patient_id: str) -> Optional[str]:
+        data_path = self._patient_path(patient_id)
+        if data_path is None:
+            return None
+
+        try:
+            return file_hash(data_path)
+        except OSError:
+            return None
+
+    def get_patient_paths(
+        self, dir_path: Optional[pathlib.Path] = None
+    ) -> Dict[str, pathlib.Path]:
+        if dir_path is not None:
+            patient_ids = self.patient_index.dir_refs.get(dir_path.resolve(), [])
+        else:
+            patient_ids = self.all_patients
+        return {
+            patient_id: self._patient_path(patient_id) for patient_id in patient_ids
+        }
+
+    @staticmethod
+    def read_signal(data_path: pathlib.Path) -> Optional[np.ndarray]:
+        try:
+            df = pd.read_csv(data_path, header=None, dtype=np.float32)
             return df.to_numpy()
         except Exception:
             return None
 
     def get_patient_label(self, patient_id: str) -> Optional[int]:
-        if patient_id not in self.patient_dir_map:
+        key = self.patient_index.resolve(patient_id)
+        if key is None:
             return None
 
-        dir_path = self.patient_dir_map[patient_id]
+        dir_path, file_stem = key
         label_df = self.label_map_dfs.get(dir_path)
 
         if label_df is None or label_df.empty:
             return None
 
-        patient_row = label_df[label_df["FileName"] == patient_id]
+        patient_row = label_df[label_df["FileName"] == file_stem]
         if patient_row.empty:
             return None
 
         return int(patient_row["Rhythm"].iloc[0])
 
     def get_patient_diagnostics(self, patient_id: str) -> Optional[Dict]:
-        if patient_id not in self.patient_dir_map:
+        key = self.patient_index.resolve(patient_id)
+        if key is None:
             return None
 
-        dir_path = self.patient_dir_map[patient_id]
-        diag_df = self.diagnostics_map.get(dir_path)
-
-        if diag_df is None or diag_df.empty:
-            return None
+        dir_path, file_stem = key
+        store = self.diagnostics_map.get(dir_path)
 
-        patient_row = diag_df[diag_df["FileName"] == patient_id]
-        if patient_row.empty:
+        if store is None:
             return None
 
-        row = patient_row.iloc[0]
-
-        return row.to_dict()
+        return store.get_row(file_stem)
 
     def update_patient_diagnostic_field(
         self, patient_id: str, field: str, value
     ) -> bool:
-        if patient_id not in self.patient_dir_map:
+        key = self.patient_index.resolve(patient_id)
+        if key is None:
             return False
 
-        dir_path = self.patient_dir_map[patient_id]
-        diag_df = self.diagnostics_map.get(dir_path)
-        diag_path = self.diagnostics_file_map.get(dir_path)
-
-        if diag_df is None or diag_path is None:
-            return False
+        dir_path, file_stem = key
+        store = self.diagnostics_map.get(dir_path)
 
-        idx = diag_df.index[diag_df["FileName"] == patient_id]
-        if idx.empty:
+        if store is None:
             return False
 
-        try:
-            diag_df.loc[idx, field] = value
-            diag_df.to_excel(diag_path, index=False)
-            return True
-        except Exception:
-            return False
+        return store.update_field(file_stem, field, value)
 
     def update_patient_rhythm(self, patient_id: str, predicted_rhythm: str) -> bool:
         return self.update_patient_diagnostic_field(
             patient_id, "Rhythm", predicted_rhythm
         )
 
+    def update_patients_rhythm(self, predicted_rhythms: Dict[str, str]) -> int:
+        """Save several predictions, one write per diagnostics store"""
+        by_dir: Dict[pathlib.Path, Dict[str, str]] = {}
+        for patient_id, predicted_rhythm in predicted_rhythms.items():
+            key = self.patient_index.resolve(patient_id)
+            if key is not None:
+                by_dir.setdefault(key[0], {})[key[1]] = predicted_rhythm
+
+        updated = 0
+        for dir_path, rhythms in by_dir.items():
+            store = self.diagnostics_map.get(dir_path)
+            if store is not None:
+                updated += store.update_fields("Rhythm", rhythms)
+        return updated
+
     def update_patient_grad(self, patient_id: str, value: int = 1) -> bool:
         return self.update_patient_diagnostic_field(patient_id, "Grad", value)
 
+    def reconcile_grad(
+        self, dir_path: pathlib.Path, has_output: Callable[[str], bool]
+    ) -> List[str]:
+        """Reset the Grad flag of a directory's patients whose output is gone
+
+        has_output is called with each flagged patient's cam key. The flags are
+        written in one go, returns the references of the patients reset.
+        """
+        dir_path = dir_path.resolve()
+        store = self.diagnostics_map.get(dir_path)
+        if store is None or "Grad" not in store.columns():
+            return []
+
+        df = store.to_dataframe()
+        flagged = df.loc[df["Grad"] == 1, "FileName"].astype(str)
+        missing = [stem for stem in flagged if not has_output(cam_key(dir_path, stem))]
+        if not missing or not store.update_fields("Grad", dict.fromkeys(missing, 0)):
+            return []
+        refs = (self.patient_index.ref(dir_path, stem) for stem in missing)
+        return [ref for ref in refs if ref is not None]
+
     def get_patient_cam_imgs(
         self, dir_path: pathlib.Path, patient_id: str, target_class: int
     ) -> Optional[List[pathlib.Path]]:
@@ -176,7 +397,8 @@ class DataManager:
                 return None
             images.append(imgs[0])
 
-        self.save_cam_imgs_as_pdf(images, patient_id, dir_path.parent)
+        # The PDF is named after the output directory, like the recording file
+        self.save_cam_imgs_as_pdf(images, dir_path.name, dir_path.parent)
         return images
 
     def save_cam_imgs_as_pdf(
@@ -198,9 +420,9 @@ class DataManager:
         print(f"Saved PDF to: {pdf_path}")
 
     def clear(self):
-        self.all_patients.clear()
-        self.patient_dir_map.clear()
+        self.patient_index.clear()
         self.label_map_dfs.clear()
+        for store in self.diagnostics_map.values():
+            store.close()
         self.diagnostics_map.clear()
-        self.diagnostics_file_map.clear()
-        self.mounted_dirs.clear()
+        self.quality_map.clear()
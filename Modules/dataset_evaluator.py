@@ -0,0 +1,353 @@
+import os
+import sys
+import argparse
+import pathlib
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from Modules.data_manager import DataManager
+from Modules.execution_profile import (
+    TUNED_PROFILE_NAME,
+    ExecutionProfile,
+    apply_profile,
+    default_profiles,
+    load_tuned_profile,
+)
+from Modules.model_manager import ModelManager
+from Modules.prediction_cache import PredictionCache, file_hash
+from Modules.preprocessing import SignalPreprocessor, read_sampling_rate
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+# Model instance owned by each worker process, set by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_path: str, profile: Dict):
+    global _worker_model
+    import tensorflow as tf
+
+    apply_profile(ExecutionProfile.from_dict(profile))
+    _worker_model = tf.keras.models.load_model(model_path)
+
+
+def _decode_shard(
+    signals: np.ndarray,
+    start: int,
+    paths: List[str],
+    input_shape: Tuple[int, int],
+    preprocessor: Optional[SignalPreprocessor],
+) -> List[int]:
+    """Decode and normalize recordings into their rows of the signal block.
+
+    Returns the indices of the recordings that could be decoded, raw
+    recordings of equal length and rate are denoised and binned together.
+    """
+    valid, raw_indices, raw_signals, raw_rates = [], [], [], []
+    for index, path in enumerate(map(pathlib.Path, paths), start):
+        data = DataManager.read_signal(path)
+        if data is None:
+            continue
+        if data.shape == input_shape:
+            ModelManager._min_max_normalize(data, out=signals[index])
+            valid.append(index)
+        elif preprocessor is not None and data.ndim == 2:
+            raw_indices.append(index)
+            raw_signals.append(data)
+            raw_rates.append(read_sampling_rate(path))
+
+    if raw_signals:
+        processed = preprocessor.transform_many(raw_signals, raw_rates)
+        for index, data in zip(raw_indices, processed):
+            if data.shape == input_shape:
+                ModelManager._min_max_normalize(data, out=signals[index])
+                valid.append(index)
+        valid.sort()
+    return valid
+
+
+def _evaluate_shard(
+    signals_name: str,
+    probs_name: str,
+    num_records: int,
+    input_shape: Tuple[int, int],
+    num_classes: int,
+    start: int,
+    paths: List[str],
+    batch_size: int,
+    preprocessor: Optional[SignalPreprocessor],
+) -> List[int]:
+    """Decode, normalize and predict one contiguous shard of the dataset.
+
+    The worker decodes its own rows straight into the shared signal block
+    and writes probabilities into the shared output block, so only paths
+    and indices cross the process boundary.
+    """
+    signals_shm = shared_memory.SharedMemory(name=signals_name)
+    probs_shm = shared_memory.SharedMemory(name=probs_name)
+    signals = np.ndarray(
+        (num_records, *input_shape), dtype=np.float32, buffer=signals_shm.buf
+    )
+    probs = np.ndarray(
+        (num_records, num_classes), dtype=np.float32, buffer=probs_shm.buf
+    )
+    try:
+        valid = _decode_shard(signals, start, paths, input_shape, preprocessor)
+        if not valid:
+            return []
+        first, stop = valid[0], valid[-1] + 1
+        if stop - first == len(valid):
+            # Fully decoded shards are predicted from a view, without a copy
+            probs[first:stop] = _worker_model.predict(
+                signals[first:stop], batch_size=batch_size, verbose=0
+            )
+        else:
+            probs[valid] = _worker_model.predict(
+                signals[valid], batch_size=batch_size, verbose=0
+            )
+        return valid
+    finally:
+        del signals, probs
+        signals_shm.close()
+        probs_shm.close()
+
+
+class DatasetEvaluator:
+    """Evaluates whole datasets by sharding patients across worker processes
+
+    The parent only allocates the shared signal and probability blocks and
+    merges the results. Each worker decodes, preprocesses and predicts its
+    own index ranges in place, so CSV parsing scales across cores too.
+    """
+
+    def __init__(
+        self,
+        model_path: pathlib.Path,
+        workers: Optional[int] = None,
+        batch_size: int = 64,
+        input_shape: Tuple[int, int] = (500, 12),
+        num_classes: int = 4,
+        cache: Optional[PredictionCache] = None,
+        preprocessor: Optional[SignalPreprocessor] = None,
+        profile: Optional[ExecutionProfile] = None,
+    ):
+        self.model_path = pathlib.Path(model_path).resolve()
+        self.batch_size = batch_size
+        self.input_shape = input_shape
+        self.num_classes = num_classes
+        self.cache = cache
+        self.preprocessor = preprocessor
+        # The auto-tuned profile saved next to the model wins over the default
+        self.profile = (
+            profile
+            or load_tuned_profile(self.model_path.parent / TUNED_PROFILE_NAME)
+            or default_profiles()["batch"]
+        )
+        # A pinned profile gets one worker per core it may use
+        self.workers = workers or self.profile.cpu_count or os.cpu_count() or 1
+
+    def evaluate(
+        self, patient_paths: Dict[str, pathlib.Path]
+    ) -> Dict[str, Optional[np.ndarray]]:
+        """Return class probabilities per patient, in the order given.
+
+        Patients whose recording could not be decoded map to None.
+        """
+        if self.cache is None:
+            return self._evaluate_uncached(patient_paths)
+
+        model_hash = file_hash(self.model_path)
+        results: Dict[str, Optional[np.ndarray]] = {}
+        recording_hashes: Dict[str, str] = {}
+        configs: Dict[str, str] = {}
+        missing: Dict[str, pathlib.Path] = {}
+        for patient_id, path in patient_paths.items():
+            results[patient_id] = None
+            try:
+                recording_hashes[patient_id] = file_hash(path)
+            except OSError:
+                continue
+            configs[patient_id] = (
+                self.preprocessor.fingerprint(read_sampling_rate(path))
+                if self.preprocessor is not None
+                else ""
+            )
+            cached = self.cache.get(
+                model_hash, recording_hashes[patient_id], configs[patient_id]
+            )
+            if cached is not None:
+                results[patient_id] = cached[1]
+            else:
+                missing[patient_id] = path
+
+        for patient_id, probabilities in self._evaluate_uncached(missing).items():
+            results[patient_id] = probabilities
+            if probabilities is not None:
+                self.cache.put(
+                    model_hash,
+                    recording_hashes[patient_id],
+                    probabilities,
+                    configs[patient_id],
+                )
+        return results
+
+    def _evaluate_uncached(
+        self, patient_paths: Dict[str, pathlib.Path]
+    ) -> Dict[str, Optional[np.ndarray]]:
+        patient_ids = list(patient_paths.keys())
+        num_records = len(patient_ids)
+        if num_records == 0:
+            return {}
+
+        workers = min(self.workers, num_records)
+        # The profile's thread budget is shared by all workers
+        worker_profile = ExecutionProfile(
+            self.profile.name,
+            max(1, self.profile.intra_op_threads // workers),
+            self.profile.inter_op_threads,
+            nice=self.profile.nice,
+        )
+        # Several shards per worker, so uneven shards still balance out
+        shard_size = max(self.batch_size, num_records // (4 * workers))
+        starts = range(0, num_records, shard_size)
+
+        signals_shm = shared_memory.SharedMemory(
+            create=True,
+            size=num_records * int(np.prod(self.input_shape)) * 4,
+        )
+        probs_shm = shared_memory.SharedMemory(
+            create=True, size=num_records * self.num_classes * 4
+        )
+        try:
+            valid = set()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(str(self.model_path), worker_profile.to_dict()),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _evaluate_shard,
+                        signals_shm.name,
+                        probs_shm.name,
+                        num_records,
+                        self.input_shape,
+                        self.num_classes,
+                        start,
+                        [
+                            str(patient_paths[patient_id])
+                            for patient_id in patient_ids[start : start + shard_size]
+                        ],
+                        self.batch_size,
+                        self.preprocessor,
+                    )
+                    for start in starts
+                ]
+                for future in futures:
+                    valid.update(future.result())
+
+            probs = np.ndarray(
+                (num_records, self.num_classes),
+                dtype=np.float32,
+                buffer=probs_shm.buf,
+            )
+            return {
+                patient_id: probs[i].copy() if i in valid else None
+                for i, patient_id in enumerate(patient_ids)
+            }
+        finally:
+            probs = None
+            signals_shm.close()
+            signals_shm.unlink()
+            probs_shm.close()
+            probs_shm.unlink()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Predict the rhythm of every patient in a directory."
+    )
+    parser.add_argument("directory", help="Patient directory with Label_Map.xlsx.")
+    parser.add_argument(
+        "--model", help="Model file, defaults to the first one in src/Models."
+    )
+    parser.add_argument("--workers", type=int, help="Worker processes.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--backend",
+        choices=("xlsx", "sqlite"),
+        default="xlsx",
+        help="Diagnostics store the predicted rhythms are saved to.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("batch", "background"),
+        default="batch",
+        help="Execution profile of the workers, batch uses the tuned one if saved.",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Skip the prediction cache."
+    )
+    args = parser.parse_args(argv)
+
+    data_root = pathlib.Path("src") / "Data"
+    if args.model:
+        model_path = pathlib.Path(args.model)
+    else:
+        models = sorted((pathlib.Path("src") / "Models").glob("*.keras"))
+        if not models:
+            print("No model found in src/Models, pass --model.")
+            return 1
+        model_path = models[0]
+
+    data_manager = DataManager(
+        diagnostics_backend=args.backend,
+        preprocessor=SignalPreprocessor(cache_dir=data_root / "Cache" / "Preprocessed"),
+    )
+    dir_path = pathlib.Path(args.directory).resolve()
+    success, message = data_manager.add_directory(dir_path)
+    if not success:
+        print(message)
+        return 1
+
+    cache = (
+        None
+        if args.no_cache
+        else PredictionCache(data_root / "Cache" / "predictions.sqlite")
+    )
+    evaluator = DatasetEvaluator(
+        model_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        cache=cache,
+        preprocessor=data_manager.preprocessor,
+        profile=(
+            default_profiles()["background"] if args.profile == "background" else None
+        ),
+    )
+    try:
+        results = evaluator.evaluate(data_manager.get_patient_paths(dir_path))
+    finally:
+        if cache is not None:
+            cache.close()
+
+    rhythms = {
+        patient_id: data_manager.label_map.get(int(np.argmax(probabilities)), "Unknown")
+        for patient_id, probabilities in results.items()
+        if probabilities is not None
+    }
+    saved = data_manager.update_patients_rhythm(rhythms)
+    data_manager.clear()
+    print(
+        f"Evaluated {len(rhythms)} of {len(results)} patients with "
+        f"{model_path.name}, saved {saved} rhythms to the {args.backend} diagnostics."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
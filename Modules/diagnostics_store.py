@@ -0,0 +1,285 @@
+import sys
+import sqlite3
+import argparse
+import pathlib
+import threading
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+
+class DiagnosticsStore(ABC):
+    """Interface for per-directory patient diagnostics storage"""
+
+    @abstractmethod
+    def get_row(self, patient_id: str) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    def update_field(self, patient_id: str, field: str, value) -> bool:
+        pass
+
+    def update_fields(self, field: str, values: Dict[str, object]) -> int:
+        """Set one field for several patients, returns how many were updated"""
+        return sum(
+            self.update_field(patient_id, field, value)
+            for patient_id, value in values.items()
+        )
+
+    @abstractmethod
+    def columns(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def to_dataframe(self) -> pd.DataFrame:
+        pass
+
+    def export_xlsx(self, xlsx_path: pathlib.Path):
+        self.to_dataframe().to_excel(xlsx_path, index=False)
+
+    def close(self):
+        pass
+
+
+class XlsxDiagnosticsStore(DiagnosticsStore):
+    """Diagnostics held in memory and written back to the whole workbook"""
+
+    def __init__(self, xlsx_path: pathlib.Path):
+        self.xlsx_path = xlsx_path
+        self.df = pd.read_excel(xlsx_path)
+
+    def get_row(self, patient_id: str) -> Optional[Dict]:
+        patient_row = self.df[self.df["FileName"] == patient_id]
+        if patient_row.empty:
+            return None
+        return patient_row.iloc[0].to_dict()
+
+    def update_field(self, patient_id: str, field: str, value) -> bool:
+        idx = self.df.index[self.df["FileName"] == patient_id]
+        if idx.empty:
+            return False
+
+        try:
+            self.df.loc[idx, field] = value
+            self.df.to_excel(self.xlsx_path, index=False)
+            return True
+        except Exception:
+            return False
+
+    def update_fields(self, field: str, values: Dict[str, object]) -> int:
+        mask = self.df["FileName"].isin(values.keys())
+        if not mask.any():
+            return 0
+
+        try:
+            if field in self.df.columns and self.df[field].dtype != object:
+                self.df[field] = self.df[field].astype(object)
+            self.df.loc[mask, field] = self.df.loc[mask, "FileName"].map(values)
+            self.df.to_excel(self.xlsx_path, index=False)
+            return int(mask.sum())
+        except Exception:
+            return 0
+
+    def columns(self) -> List[str]:
+        return list(self.df.columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return self.df.copy()
+
+
+class SqliteDiagnosticsStore(DiagnosticsStore):
+    """Diagnostics in a WAL-mode SQLite table indexed on FileName
+
+    Every thread gets its own connection, so readers never block each other
+    and single-row updates run in their own transaction. All connections are
+    tracked and closed together by close(). The column list is read once on
+    open and kept up to date by the methods that change the schema.
+    """
+
+    TABLE = "diagnostics"
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._read_columns(conn)
+            self._ensure_index(conn)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self.db_path), timeout=30, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read_columns(self, conn: sqlite3.Connection) -> List[str]:
+        rows = conn.execute(f"PRAGMA table_info({self.TABLE})")
+        self._columns = [row["name"] for row in rows]
+        return self._columns
+
+    def _add_column(self, conn: sqlite3.Connection, field: str):
+        """Add a column, unless another connection or process already did"""
+        try:
+            conn.execute(f'ALTER TABLE {self.TABLE} ADD COLUMN "{field}"')
+        except sqlite3.OperationalError:
+            if field not in self._read_columns(conn):
+                raise
+        else:
+            self._columns = self._columns + [field]
+
+    def _ensure_index(self, conn: sqlite3.Connection):
+        if self._columns:
+            conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{self.TABLE}_filename "
+                f'ON {self.TABLE} ("FileName")'
+            )
+
+    def import_xlsx(self, xlsx_path: pathlib.Path):
+        """Replace the table contents with the rows of a Diagnostics.xlsx"""
+        df = pd.read_excel(xlsx_path)
+        conn = self._connection()
+        with conn:
+            df.to_sql(self.TABLE, conn, if_exists="replace", index=False)
+            self._read_columns(conn)
+            self._ensure_index(conn)
+
+    def get_row(self, patient_id: str) -> Optional[Dict]:
+        if not self._columns:
+            return None
+        row = (
+            self._connection()
+            .execute(f'SELECT * FROM {self.TABLE} WHERE "FileName" = ?', (patient_id,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return dict(row)
+
+    def update_field(self, patient_id: str, field: str, value) -> bool:
+        if '"' in field:
+            return False
+
+        conn = self._connection()
+        try:
+            with conn:
+                if field not in self._columns:
+                    self._add_column(conn, field)
+                cursor = conn.execute(
+                    f'UPDATE {self.TABLE} SET "{field}" = ? WHERE "FileName" = ?',
+                    (value, patient_id),
+                )
+                return cursor.rowcount > 0
+        except Exception:
+            self._read_columns(conn)
+            return False
+
+    def update_fields(self, field: str, values: Dict[str, object]) -> int:
+        if '"' in field:
+            return 0
+
+        conn = self._connection()
+        try:
+            with conn:
+                if field not in self._columns:
+                    self._add_column(conn, field)
+                cursor = conn.executemany(
+                    f'UPDATE {self.TABLE} SET "{field}" = ? WHERE "FileName" = ?',
+                    [(value, patient_id) for patient_id, value in values.items()],
+                )
+                return cursor.rowcount
+        except Exception:
+            self._read_columns(conn)
+            return 0
+
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.read_sql_query(f"SELECT * FROM {self.TABLE}", self._connection())
+
+    def close(self):
+        """Close the connections of every thread that used the store"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local = threading.local()
+
+
+def open_diagnostics_store(
+    dir_path: pathlib.Path, backend: str = "xlsx"
+) -> Optional[DiagnosticsStore]:
+    """Open the diagnostics of a patient directory with the given backend
+
+    The SQLite database is created next to Diagnostics.xlsx and seeded from it
+    on first use.
+    """
+    xlsx_path = dir_path / "Diagnostics.xlsx"
+    if backend == "xlsx":
+        return XlsxDiagnosticsStore(xlsx_path) if xlsx_path.exists() else None
+
+    if backend == "sqlite":
+        db_path = dir_path / "Diagnostics.sqlite"
+        if not db_path.exists() and not xlsx_path.exists():
+            return None
+        store = SqliteDiagnosticsStore(db_path)
+        if not store.columns() and xlsx_path.exists():
+            store.import_xlsx(xlsx_path)
+        return store
+
+    raise ValueError(f"Unknown diagnostics backend: {backend}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage patient diagnostics.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser(
+        "export", help="Write a directory's SQLite diagnostics to the xlsx layout."
+    )
+    export.add_argument("directory", help="Patient directory.")
+    export.add_argument(
+        "--output", help="Workbook to write, defaults to Diagnostics.xlsx."
+    )
+    reimport = commands.add_parser(
+        "import", help="Replace a directory's SQLite diagnostics with its xlsx."
+    )
+    reimport.add_argument("directory", help="Patient directory.")
+    args = parser.parse_args(argv)
+
+    dir_path = pathlib.Path(args.directory)
+    if args.command == "import":
+        xlsx_path = dir_path / "Diagnostics.xlsx"
+        if not xlsx_path.exists():
+            print(f"Diagnostics not found at {xlsx_path}")
+            return 1
+        store = SqliteDiagnosticsStore(dir_path / "Diagnostics.sqlite")
+        store.import_xlsx(xlsx_path)
+        print(f"Imported {len(store.to_dataframe())} rows from {xlsx_path}.")
+        store.close()
+        return 0
+
+    store = open_diagnostics_store(dir_path, "sqlite")
+    if store is None:
+        print(f"No diagnostics found in {dir_path}")
+        return 1
+    xlsx_path = (
+        pathlib.Path(args.output) if args.output else dir_path / "Diagnostics.xlsx"
+    )
+    try:
+        store.export_xlsx(xlsx_path)
+        print(f"Exported {len(store.to_dataframe())} rows to {xlsx_path}.")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,8 +7,13 @@ class ECGPlotter:
     def __init__(self, plot_widget: pg.PlotWidget):
         self.plot_widget = plot_widget
         self.scaler = preprocessing.MinMaxScaler(feature_range=(-1, 1))
+        self.long_recording = None
+        self.long_curve = None
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self._update_long_view)
 
     def plot_signal(self, data: np.ndarray):
+        self.long_recording = None
+        self.long_curve = None
         self.plot_widget.clear()
 
         # Normalize x and y values for better appearence
@@ -18,7 +23,27 @@ class ECGPlotter:
         y_values = data[:, 0].reshape(-1, 1)
         y_normalized = self.scaler.fit_transform(y_values).flatten()
 
+        # A previous long recording may have fixed the X range
+        self.plot_widget.enableAutoRange(axis="x")
         self.plot_widget.setYRange(-1.5, 1.5)
         self.plot_widget.plot(
             x_normalized, y_normalized, pen="g", width=1.5, name="ECG Signal"
         )
+
+    def plot_long_recording(self, recording):
+        """Plot a LongRecording, drawing only the visible part at screen resolution"""
+        self.plot_widget.clear()
+        self.long_recording = recording
+        self.long_curve = self.plot_widget.plot(pen="g", name="ECG Signal")
+        self.plot_widget.enableAutoRange(axis="y")
+        self.plot_widget.setXRange(0, recording.duration, padding=0)
+        self._update_long_view()
+
+    def _update_long_view(self, *args):
+        if self.long_recording is None or self.long_curve is None:
+            return
+
+        start, stop = self.plot_widget.getViewBox().viewRange()[0]
+        max_points = max(2 * self.plot_widget.width(), 1000)
+        x, y = self.long_recording.get_view(start, stop, max_points)
+        self.long_curve.setData(x, y)
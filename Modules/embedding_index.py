@@ -0,0 +1,220 @@
+import json
+import pathlib
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[str, str]
+
+
+class EmbeddingIndex:
+    """Persistent patient embeddings with top-k cosine similarity search
+
+    Embeddings of one model live in a contiguous float32 matrix saved as
+    vectors.npy, rows are described by entries.json. Rows are replaced in place
+    when a recording changes and appended otherwise, so the index can be
+    updated incrementally. Search is exact by default, an inverted file of
+    k-means lists can be built for approximate search on very large indexes.
+    """
+
+    VECTORS_NAME = "vectors.npy"
+    ENTRIES_NAME = "entries.json"
+
+    def __init__(self, root: pathlib.Path, model_hash: str):
+        self.model_hash = model_hash
+        self.dir_path = pathlib.Path(root) / model_hash[:16]
+        self.vectors_path = self.dir_path / self.VECTORS_NAME
+        self.entries_path = self.dir_path / self.ENTRIES_NAME
+        self.size = 0
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.unit_vectors = np.empty((0, 0), dtype=np.float32)
+        self.entries: List[Dict] = []
+        self.positions: Dict[Key, int] = {}
+        self.dir_codes: Dict[str, int] = {}
+        self.row_dirs = np.empty(0, dtype=np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+        self._load()
+
+    def _load(self):
+        if not (self.vectors_path.exists() and self.entries_path.exists()):
+            return
+        try:
+            vectors = np.load(self.vectors_path)
+            with open(self.entries_path) as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Failed to load embedding index {self.dir_path}: {e}")
+            return
+
+        if len(vectors) != len(entries):
+            print(f"Embedding index {self.dir_path} is inconsistent, ignoring it")
+            return
+        self.entries = entries
+        self.positions = {
+            (entry["dir"], entry["patient"]): row for row, entry in enumerate(entries)
+        }
+        self.size = len(entries)
+        self.row_dirs = np.array(
+            [self._dir_code(entry["dir"]) for entry in entries], dtype=np.int32
+        )
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.unit_vectors = self._normalize(self.vectors)
+
+    def save(self):
+        try:
+            self.dir_path.mkdir(parents=True, exist_ok=True)
+            tmp_vectors = self.vectors_path.with_suffix(".tmp.npy")
+            np.save(tmp_vectors, self.vectors[: self.size])
+            tmp_entries = self.entries_path.with_suffix(".tmp")
+            with open(tmp_entries, "w") as f:
+                json.dump(self.entries, f)
+            tmp_vectors.replace(self.vectors_path)
+            tmp_entries.replace(self.entries_path)
+        except OSError as e:
+            print(f"Failed to save embedding index {self.dir_path}: {e}")
+
+    def _dir_code(self, dir_path: str) -> int:
+        return self.dir_codes.setdefault(dir_path, len(self.dir_codes))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self.positions
+
+    def get(self, key: Key) -> Optional[np.ndarray]:
+        row = self.positions.get(key)
+        return None if row is None else self.vectors[row]
+
+    def is_current(self, key: Key, recording_hash: str) -> bool:
+        row = self.positions.get(key)
+        return row is not None and self.entries[row]["hash"] == recording_hash
+
+    def _reserve(self, rows: int, dim: int):
+        if self.vectors.shape[1] not in (0, dim):
+            raise ValueError(
+                f"Embedding size {dim} does not match index size {self.vectors.shape[1]}"
+            )
+        if rows <= len(self.vectors) and self.vectors.shape[1] == dim:
+            return
+
+        capacity = max(rows, 2 * len(self.vectors), 1024)
+        for name in ("vectors", "unit_vectors"):
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            if self.size:
+                grown[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, grown)
+        grown = np.zeros(capacity, dtype=np.int32)
+        grown[: self.size] = self.row_dirs[: self.size]
+        self.row_dirs = grown
+        if self.assignments is not None:
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[: self.size] = self.assignments[: self.size]
+            self.assignments = grown
+
+    def add(
+        self,
+        keys: List[Key],
+        recording_hashes: List[str],
+        vectors: np.ndarray,
+    ):
+        """Insert or replace the embeddings of (directory, patient) keys"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.positions]
+        self._reserve(self.size + len(new_keys), vectors.shape[1])
+
+        for key in new_keys:
+            self.positions[key] = self.size
+            self.entries.append({"dir": key[0], "patient": key[1], "hash": None})
+            self.row_dirs[self.size] = self._dir_code(key[0])
+            self.size += 1
+
+        rows = np.array([self.positions[key] for key in keys], dtype=np.int64)
+        for row, recording_hash in zip(rows, recording_hashes):
+            self.entries[row]["hash"] = recording_hash
+        self.vectors[rows] = vectors
+        self.unit_vectors[rows] = self._normalize(vectors)
+        if self.centroids is not None:
+            nearest = self._nearest_lists(self.unit_vectors[rows], 1)
+            self.assignments[rows] = nearest[:, 0]
+
+    def build_lists(self, n_lists: Optional[int] = None, iterations: int = 10):
+        """Cluster the index into k-means lists for approximate search"""
+        if self.size == 0:
+            return
+
+        n_lists = min(n_lists or int(np.sqrt(self.size)), self.size)
+        data = self.unit_vectors[: self.size]
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self.size, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            counts = np.bincount(assignments, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = self._normalize(sums[filled])
+
+        self.centroids = centroids
+        self.assignments = np.full(len(self.vectors), -1, dtype=np.int32)
+        self.assignments[: self.size] = np.argmax(data @ centroids.T, axis=1)
+
+    def _nearest_lists(self, unit_vectors: np.ndarray, n_probe: int) -> np.ndarray:
+        scores = unit_vectors @ self.centroids.T
+        n_probe = min(n_probe, len(self.centroids))
+        return np.argpartition(-scores, n_probe - 1, axis=1)[:, :n_probe]
+
+    def query(
+        self,
+        vector: np.ndarray,
+        k: int = 10,
+        exclude: Iterable[Key] = (),
+        dirs: Optional[Iterable[str]] = None,
+        n_probe: Optional[int] = None,
+    ) -> List[Tuple[str, str, float]]:
+        """Top-k (directory, patient, cosine similarity) for an embedding
+
+        Passing n_probe searches only that many k-means lists, building them
+        first if needed. dirs restricts results to those directories.
+        """
+        if self.size == 0:
+            return []
+
+        query = self._normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+        mask = np.ones(self.size, dtype=bool)
+        if n_probe is not None:
+            if self.centroids is None:
+                self.build_lists()
+            lists = self._nearest_lists(query, n_probe)[0]
+            mask &= np.isin(self.assignments[: self.size], lists)
+        if dirs is not None:
+            codes = [self.dir_codes[d] for d in dirs if d in self.dir_codes]
+            mask &= np.isin(self.row_dirs[: self.size], codes)
+        mask[[self.positions[key] for key in exclude if key in self.positions]] = False
+
+        if n_probe is not None:
+            candidates = np.flatnonzero(mask)
+            scores = self.unit_vectors[candidates] @ query[0]
+        else:
+            candidates = np.arange(self.size)
+            scores = self.unit_vectors[: self.size] @ query[0]
+            scores[~mask] = -np.inf
+        k = min(k, int(mask.sum()))
+        if k == 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                self.entries[candidates[i]]["dir"],
+                self.entries[candidates[i]]["patient"],
+                float(scores[i]),
+            )
+            for i in top
+        ]
@@ -0,0 +1,75 @@
+import traceback
+from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
+
+
+class EmbeddingWorkerSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+
+class EmbeddingWorker(QRunnable):
+    """Worker class for embedding extraction, to prevent main loop blocking
+
+    Only patients whose recording is missing from the index or changed since
+    it was indexed are run through the model.
+    """
+
+    def __init__(
+        self, model_manager, data_manager, index, patient_ids, batch_size: int = 256
+    ):
+        super().__init__()
+        self.model_manager = model_manager
+        self.data_manager = data_manager
+        self.index = index
+        self.patient_ids = patient_ids
+        self.batch_size = batch_size
+
+        self.signals = EmbeddingWorkerSignals()
+
+    def run(self):
+        try:
+            pending = []
+            for patient_id in self.patient_ids:
+                if self.data_manager.is_long_recording(patient_id):
+                    continue
+                key = self.data_manager.get_patient_key(patient_id)
+                recording_hash = self.data_manager.get_patient_hash(patient_id)
+                if key is None or recording_hash is None:
+                    continue
+                if not self.index.is_current(key, recording_hash):
+                    pending.append((patient_id, key, recording_hash))
+
+            input_shape = tuple(self.model_manager.current_model.input_shape[1:])
+            indexed = 0
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start : start + self.batch_size]
+                loaded = self.data_manager.get_patients_data([p for p, _, _ in chunk])
+                chunk = [
+                    (p, key, recording_hash)
+                    for p, key, recording_hash in chunk
+                    if p in loaded and loaded[p].shape == input_shape
+                ]
+                if chunk:
+                    embeddings = self.model_manager.extract_embeddings(
+                        [loaded[p] for p, _, _ in chunk]
+                    )
+                    if embeddings is None:
+                        raise RuntimeError("Embedding extraction failed")
+                    self.index.add(
+                        [key for _, key, _ in chunk],
+                        [recording_hash for _, _, recording_hash in chunk],
+                        embeddings,
+                    )
+                    indexed += len(chunk)
+                self.signals.progress.emit(
+                    min(start + self.batch_size, len(pending)), len(pending)
+                )
+
+            if indexed:
+                self.index.save()
+            self.signals.finished.emit(indexed)
+        except Exception as e:
+            print(f"Embedding extraction error: {e}")
+            print(f"Traceback: {traceback.format_exc()}")
+            self.signals.error.emit(str(e))
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import argparse
+import pathlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+# Saved next to the models, replaces the batch profile when present
+TUNED_PROFILE_NAME = "execution_profile.json"
+
+
+class ExecutionProfile:
+    """TensorFlow threading and CPU placement for one kind of workload"""
+
+    def __init__(
+        self,
+        name: str,
+        intra_op_threads: int,
+        inter_op_threads: int,
+        cpu_count: Optional[int] = None,
+        nice: int = 0,
+    ):
+        self.name = name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.cpu_count = cpu_count
+        self.nice = nice
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "cpu_count": self.cpu_count,
+            "nice": self.nice,
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> "ExecutionProfile":
+        return cls(
+            values["name"],
+            values["intra_op_threads"],
+            values["inter_op_threads"],
+            values.get("cpu_count"),
+            values.get("nice", 0),
+        )
+
+
+def default_profiles(cpus: Optional[int] = None) -> Dict[str, ExecutionProfile]:
+    """Built-in profiles, each is picked once when a process starts"""
+    cpus = cpus or os.cpu_count() or 1
+    return {
+        # Leave half of the cores to the Qt thread and Grad-CAM workers
+        "interactive": ExecutionProfile("interactive", max(1, cpus // 2), 1),
+        "batch": ExecutionProfile("batch", cpus, 2),
+        "background": ExecutionProfile(
+            "background", max(1, cpus // 4), 1, cpu_count=max(1, cpus // 4), nice=10
+        ),
+    }
+
+
+def apply_placement(profile: ExecutionProfile):
+    """Pin the current process to the profile's cores and lower its priority
+
+    Niceness cannot be raised back, so this is only meant for worker
+    processes, never for the interactive one.
+    """
+    if profile.cpu_count and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, cpus[-profile.cpu_count :])
+    if profile.nice and hasattr(os, "nice"):
+        os.nice(profile.nice)
+
+
+def apply_profile(profile: ExecutionProfile, placement: bool = True) -> bool:
+    """Apply a profile to the current process at startup
+
+    TensorFlow only accepts thread settings before its runtime starts, so this
+    must run before the first model is loaded and the profile then holds for
+    the life of the process. placement also applies the affinity and niceness,
+    see apply_placement.
+    """
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(profile.intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(profile.inter_op_threads)
+    except RuntimeError as e:
+        print(f"Could not apply execution profile {profile.name}: {e}")
+        return False
+
+    if placement:
+        apply_placement(profile)
+    return True
+
+
+def load_tuned_profile(config_path: pathlib.Path) -> Optional[ExecutionProfile]:
+    if not config_path.exists():
+        return None
+
+    try:
+        with open(config_path) as f:
+            return ExecutionProfile.from_dict(json.load(f)["profile"])
+    except Exception as e:
+        print(f"Failed to load tuned execution profile {config_path}: {e}")
+        return None
+
+
+def _benchmark(
+    model_path: str,
+    intra_op_threads: int,
+    inter_op_threads: int,
+    batch_size: int,
+    iterations: int,
+) -> float:
+    """Predict throughput in recordings per second, in a fresh process"""
+    import numpy as np
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    model = tf.keras.models.load_model(model_path)
+
+    batch = np.random.default_rng(0).random(
+        (batch_size, *model.input_shape[1:]), dtype=np.float32
+    )
+    model.predict(batch, verbose=0)
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        model.predict(batch, verbose=0)
+    return batch_size * iterations / (time.perf_counter() - start_time)
+
+
+def autotune(
+    model_path: pathlib.Path,
+    config_path: pathlib.Path,
+    batch_size: int = 32,
+    iterations: int = 20,
+    candidates: Optional[List[Tuple[int, int]]] = None,
+) -> Optional[ExecutionProfile]:
+    """Benchmark thread settings on a model and save the fastest one
+
+    Each (intra, inter) candidate runs in its own process because the threading
+    of an initialized TensorFlow runtime cannot be changed.
+    """
+    if candidates is None:
+        cpus = os.cpu_count() or 1
+        intra_options = sorted({1, 2, 4, max(1, cpus // 2), cpus})
+        candidates = [
+            (intra, inter)
+            for intra in intra_options
+            if intra <= cpus
+            for inter in (1, 2)
+        ]
+
+    results = {}
+    for intra, inter in candidates:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=mp.get_context("spawn")
+            ) as executor:
+                results[(intra, inter)] = executor.submit(
+                    _benchmark, str(model_path), intra, inter, batch_size, iterations
+                ).result()
+            print(
+                f"intra={intra} inter={inter}: "
+                f"{results[(intra, inter)]:.1f} recordings/s"
+            )
+        except Exception as e:
+            print(f"Benchmark failed for intra={intra} inter={inter}: {e}")
+
+    if not results:
+        return None
+
+    (intra, inter), throughput = max(results.items(), key=lambda item: item[1])
+    profile = ExecutionProfile("batch", intra, inter)
+    try:
+        with open(config_path, "w") as f:
+            json.dump(
+                {
+                    "model": pathlib.Path(model_path).name,
+                    "batch_size": batch_size,
+                    "recordings_per_second": throughput,
+                    "profile": profile.to_dict(),
+                },
+                f,
+                indent=2,
+            )
+    except OSError as e:
+        print(f"Failed to save execution profile to {config_path}: {e}")
+    return profile
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage execution profiles.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    tune = commands.add_parser(
+        "autotune", help="Benchmark thread settings and save the fastest."
+    )
+    tune.add_argument("model", help="Model file to benchmark.")
+    tune.add_argument(
+        "--output", help=f"Profile file, defaults to {TUNED_PROFILE_NAME} next to it."
+    )
+    tune.add_argument("--batch-size", type=int, default=32)
+    tune.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    model_path = pathlib.Path(args.model)
+    if not model_path.exists():
+        print(f"Model not found: {model_path}")
+        return 1
+
+    config_path = (
+        pathlib.Path(args.output)
+        if args.output
+        else model_path.parent / TUNED_PROFILE_NAME
+    )
+    profile = autotune(model_path, config_path, args.batch_size, args.iterations)
+    if profile is None:
+        print("Every benchmark failed, no profile saved.")
+        return 1
+
+    print(
+        f"Saved intra={profile.intra_op_threads} inter={profile.inter_op_threads} "
+        f"to {config_path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,24 @@
 import time
 import logging
+import tempfile
 import traceback
 import pathlib
+import numpy as np
+from typing import Dict, List, Tuple
 from signal_grad_cam import TfCamBuilder
 from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
 
+from Modules.model_manager import ModelManager
+
+GRAD_TARGET_LAYER_NAME = "res_3_conv_2"
+GRAD_TARGET_CLASSES = [0, 1, 2, 3]
+GRAD_CLASS_LABELS = [
+    "Atrial Fibrillation",
+    "Supraventricular Tachycardia",
+    "Sinus Bradycardia",
+    "Sinus Rhythm",
+]
+
 
 class GradCamWorkerSignals(QObject):
     finished = pyqtSignal()
@@ -25,14 +39,9 @@ class GradCamWorker(QRunnable):
         self.dir_path = dir_path.resolve()
 
         self.signals = GradCamWorkerSignals()
-        self.grad_target_layer_name = "res_3_conv_2"
-        self.grad_target_classes = [0, 1, 2, 3]
-        self.grad_class_labels = [
-            "Atrial Fibrillation",
-            "Supraventricular Tachycardia",
-            "Sinus Bradycardia",
-            "Sinus Rhythm",
-        ]
+        self.grad_target_layer_name = GRAD_TARGET_LAYER_NAME
+        self.grad_target_classes = GRAD_TARGET_CLASSES
+        self.grad_class_labels = GRAD_CLASS_LABELS
 
     def run(self):
         # This project uses SignalGrad-CAM (Pe et al., 2025)
@@ -104,3 +113,171 @@ class GradCamWorker(QRunnable):
             logging.error(f"GradCam Error: {error_msg}")
             logging.error(f"Traceback: {traceback_msg}")
             self.signals.error.emit(str(e))
+
+
+class CohortGradCamWorkerSignals(QObject):
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+    patient_finished = pyqtSignal(str, int)
+    log = pyqtSignal(str)
+
+
+class CohortGradCamWorker(QRunnable):
+    """Worker class for the Grad-CAM of many patients at once
+
+    Patients are grouped by their label, each group is explained in batched
+    forward/backward passes for that class only, and the channel plots and
+    PDF of every patient are written to cams_root/<its cam key>.
+    """
+
+    def __init__(
+        self,
+        model,
+        data_manager,
+        patient_labels: Dict[str, int],
+        cams_root: pathlib.Path,
+        batch_size: int = 64,
+    ):
+        super().__init__()
+        self.model = model
+        self.data_manager = data_manager
+        self.patient_labels = patient_labels
+        self.cams_root = cams_root.resolve()
+        self.batch_size = batch_size
+
+        self.signals = CohortGradCamWorkerSignals()
+
+    def _load_batch(self, patient_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        loaded = self.data_manager.get_patients_data(patient_ids)
+        input_shape = tuple(self.model.input_shape[1:])
+        batch_ids = []
+        for patient_id in patient_ids:
+            if patient_id not in loaded:
+                self.signals.log.emit(
+                    f"Skipping {patient_id}, could not load its data."
+                )
+            elif loaded[patient_id].shape != input_shape:
+                self.signals.log.emit(
+                    f"Skipping {patient_id}, its shape {loaded[patient_id].shape} "
+                    f"does not match the model input {input_shape}."
+                )
+            else:
+                batch_ids.append(patient_id)
+        if not batch_ids:
+            return [], np.empty(0, dtype=np.float32)
+        return batch_ids, np.concatenate(
+            [ModelManager.prepare_input(loaded[p]) for p in batch_ids]
+        )
+
+    def run(self):
+        # This project uses SignalGrad-CAM (Pe et al., 2025)
+        # Source: https://github.com/bmi-labmedinfo/signal_grad_cam
+        start_time = time.time()
+        total = len(self.patient_labels)
+        self.signals.log.emit(f"Starting Grad-CAM generation for {total} patients...")
+        try:
+            cam_builder = TfCamBuilder(
+                self.model, class_names=GRAD_CLASS_LABELS, time_axs=0
+            )
+
+            groups: Dict[int, List[str]] = {}
+            for patient_id, label in self.patient_labels.items():
+                groups.setdefault(label, []).append(patient_id)
+
+            done = 0
+            for label, group in groups.items():
+                for start in range(0, len(group), self.batch_size):
+                    patient_ids, batch = self._load_batch(
+                        group[start : start + self.batch_size]
+                    )
+                    if not patient_ids:
+                        continue
+
+                    step_time = time.time()
+                    labels = [label] * len(patient_ids)
+                    # get_cam always stores overview plots, the PDF does not use them
+                    with tempfile.TemporaryDirectory() as scratch_dir:
+                        cams, predicted_probs_dict, bar_ranges = cam_builder.get_cam(
+                            batch,
+                            data_labels=labels,
+                            target_classes=[label],
+                            explainer_types="Grad-CAM",
+                            target_layers=GRAD_TARGET_LAYER_NAME,
+                            softmax_final=False,
+                            data_names=patient_ids,
+                            data_sampling_freq=50,
+                            dt=1,
+                            results_dir_path=scratch_dir,
+                        )
+                    self.signals.log.emit(
+                        f"Computed {len(patient_ids)} CAMs for class {label} "
+                        f"in {time.time() - step_time:.2f} seconds."
+                    )
+
+                    for i, patient_id in enumerate(patient_ids):
+                        cam_key = self.data_manager.get_cam_key(patient_id)
+                        if cam_key is None:
+                            self.signals.log.emit(
+                                f"Skipping {patient_id}, its directory was removed."
+                            )
+                            continue
+                        # Slice out the patient, the display indexes colour
+                        # bar ranges by position rather than by batch index
+                        patient_cams = {k: v[i : i + 1] for k, v in cams.items()}
+                        patient_probs = {
+                            k: v[i : i + 1] for k, v in predicted_probs_dict.items()
+                        }
+                        patient_ranges = {
+                            k: (v[0][i : i + 1], v[1][i : i + 1])
+                            for k, v in bar_ranges.items()
+                        }
+                        dir_path = self.cams_root / cam_key
+                        for channel in range(12):
+                            results_dir_path = dir_path / f"channel_{channel}"
+                            results_dir_path.mkdir(parents=True, exist_ok=True)
+                            cam_builder.single_channel_output_display(
+                                data_list=batch[i : i + 1],
+                                data_labels=[label],
+                                predicted_probs_dict=patient_probs,
+                                cams_dict=patient_cams,
+                                explainer_types="Grad-CAM",
+                                target_classes=[label],
+                                target_layers=GRAD_TARGET_LAYER_NAME,
+                                desired_channels=[channel],
+                                data_names=[patient_id],
+                                fig_size=(20, 10),
+                                grid_instructions=(1, 1),
+                                bar_ranges_dict=patient_ranges,
+                                results_dir_path=str(results_dir_path),
+                                data_sampling_freq=50,
+                                dt=1,
+                                line_width=0.5,
+                                marker_width=30,
+                                axes_names=(None, None),
+                            )
+
+                        done += 1
+                        images = self.data_manager.get_patient_cam_imgs(
+                            dir_path, patient_id, label
+                        )
+                        if images is None:
+                            self.signals.log.emit(
+                                f"Failed to create PDF for {patient_id}"
+                            )
+                            continue
+                        self.signals.log.emit(f"Finished {patient_id} ({done}/{total})")
+                        self.signals.patient_finished.emit(patient_id, label)
+
+            self.signals.log.emit(
+                f"Grad-CAM generation completed in {time.time() - start_time:.2f} seconds."
+            )
+            self.signals.finished.emit()
+
+        except Exception as e:
+            error_msg = str(e)
+            traceback_msg = traceback.format_exc()
+            print(f"GradCam Error: {error_msg}")
+            print(f"Traceback: {traceback_msg}")
+            logging.error(f"GradCam Error: {error_msg}")
+            logging.error(f"Traceback: {traceback_msg}")
+            self.signals.error.emit(str(e))
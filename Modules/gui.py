@@ -14,6 +14,7 @@ from PyQt5.QtWidgets import (
     QComboBox,
     QFileDialog,
     QHBoxLayout,
+    QInputDialog,
     QLabel,
     QLineEdit,
     QListWidget,
@@ -28,24 +29,82 @@ from PyQt5.QtCore import QThreadPool
 from pyqt_svg_button.svgButton import SvgButton
 
 from Modules.data_manager import DataManager
+from Modules.preprocessing import SignalPreprocessor
 from Modules.ecg_plotter import ECGPlotter
 from Modules.model_manager import ModelManager
-from Modules.grad_worker import GradCamWorker
+from Modules.grad_worker import CohortGradCamWorker, GradCamWorker
+from Modules.patient_worker import PatientLoadWorker
+from Modules.cam_cache import CamCacheManager
+from Modules.quality_worker import QualityScanWorker
+from Modules.cam_worker import CamReconcileWorker
+from Modules.quality_scan import UNCHECKED_FLAG
+from Modules.embedding_index import EmbeddingIndex
+from Modules.embedding_worker import EmbeddingWorker
+from Modules.window_worker import WindowPredictionWorker
 from Modules.loading_dial import LoadingDialog
 
+ICONS_DIR = pathlib.Path(__file__).resolve().parent.parent / "src" / "icons"
 
-class App(QMainWindow):
-    """Main application class"""
 
-    def __init__(self):
+class IconButton(SvgButton):
+    """SvgButton taking an absolute icon path
+
+    SvgButton.setIcon resolves the path from the caller's source lines, which
+    fails for frames without source, e.g. when started with python -m.
+    """
+
+    def setIcon(self, icon: str):
+        self._SvgAbstractButton__icon = icon
+        self._SvgAbstractButton__styleInit()
+
+
+class App(QMainWindow):
+    """Main application class
+
+    Caches and Grad-CAM output go under data_root, src/Data of the working
+    directory by default.
+    """
+
+    def __init__(
+        self,
+        diagnostics_backend: str = "xlsx",
+        profile: str = "interactive",
+        scan_quality: bool = True,
+        data_root: Optional[pathlib.Path] = None,
+    ):
         super().__init__()
+        data_root = pathlib.Path(data_root or pathlib.Path.cwd() / "src" / "Data")
         self.threadpool = QThreadPool()
-        self.data_manager = DataManager()
+        self.loader_pool = QThreadPool()
+        self.loader_pool.setMaxThreadCount(2)
+        self._load_generation = 0
+        self.data_manager = DataManager(
+            diagnostics_backend=diagnostics_backend,
+            preprocessor=SignalPreprocessor(
+                cache_dir=data_root / "Cache" / "Preprocessed"
+            ),
+            long_recording_dir=data_root / "Cache" / "Long",
+        )
         self.model_manager = ModelManager(
-            str(pathlib.Path.cwd() / pathlib.Path("src/Models").resolve())
+            str(pathlib.Path.cwd() / pathlib.Path("src/Models").resolve()),
+            cache_path=str(data_root / "Cache" / "predictions.sqlite"),
+            profile=profile,
         )
 
+        self.cam_cache = CamCacheManager(
+            data_root / "Cams", on_evict=self._on_cam_evicted
+        )
+
+        self.embedding_root = data_root / "Cache" / "Embeddings"
+        self.embedding_index: Optional[EmbeddingIndex] = None
+        self._embedding_running = False
+        self._windows_running = False
+        # Directories whose Grad flags are being reconciled, True to run again
+        self._reconciling: Dict[pathlib.Path, bool] = {}
+        self.scan_quality = scan_quality
+
         self.selected_patient: Optional[str] = None
+        self.current_long_recording = None
         self.current_prediction: Optional[int] = None
         self.current_prediction_text: Optional[str] = None
 
@@ -57,7 +116,7 @@ class App(QMainWindow):
         self._load_initial_model()
 
     def _setup_ui(self):
-        icon = str(pathlib.Path.cwd() / "src" / "icons" / "appicon.png")
+        icon = str(ICONS_DIR / "appicon.png")
 
         self.setWindowIcon(QIcon(icon))
 
@@ -88,6 +147,13 @@ class App(QMainWindow):
         layout.addWidget(self.search_bar)
         self.search_bar.setEnabled(False)
 
+        # Quality filter
+        self.quality_filter = QComboBox()
+        self.quality_filter.addItems(["All patients", "Flagged", "Clean", "Unchecked"])
+        self.quality_filter.setToolTip("Filter patients by recording quality.")
+        layout.addWidget(self.quality_filter)
+        self.quality_filter.setEnabled(False)
+
         # Patient list
         self.patient_list = QListWidget()
         self.patient_list.setAlternatingRowColors(True)
@@ -104,18 +170,22 @@ class App(QMainWindow):
 
         buttons_config = [
             ("btn_add", "add.svg", "Add directory."),
-            ("btn_remove", "remove.svg", "Remove current directory."),
+            ("btn_remove", "remove.svg", "Remove a mounted directory."),
             ("btn_save", "save.svg", "Save patient rhythm data."),
             ("btn_grad", "grad.svg", "Generate patient GRAD-CAM data"),
             ("btn_view", "view.svg", "View generated patient Grad-CAM data as PDF"),
             ("btn_eval", "eval.svg", "Predict patient rhythm data."),
+            ("btn_similar", "similar.svg", "Find patients with similar ECGs."),
+            (
+                "btn_cohort",
+                "cohort.svg",
+                "Generate GRAD-CAM data for every listed patient with a saved rhythm",
+            ),
         ]
 
         for attr_name, icon_filename, tooltip in buttons_config:
-            icon_path = str(pathlib.Path.cwd() / "src" / "icons" / icon_filename)
-
-            btn = SvgButton(self)
-            btn.setIcon(icon_path)
+            btn = IconButton(self)
+            btn.setIcon((ICONS_DIR / icon_filename).as_posix())
             btn.setToolTip(tooltip)
             btn.setFixedSize(40, 40)
             setattr(self, attr_name, btn)
@@ -127,6 +197,8 @@ class App(QMainWindow):
         self.btn_eval.setEnabled(False)
         self.btn_view.setEnabled(False)
         self.btn_remove.setEnabled(False)
+        self.btn_similar.setEnabled(False)
+        self.btn_cohort.setEnabled(False)
 
         return layout
 
@@ -161,6 +233,12 @@ class App(QMainWindow):
         self.model_options = QComboBox()
         available_models = self.model_manager.get_available_models()
         self.model_options.addItems(available_models)
+        for i, model_name in enumerate(available_models):
+            self.model_options.setItemData(
+                i, self._model_summary(model_name), Qt.ToolTipRole
+            )
+        if len(available_models) > 1:
+            self.model_options.addItem(ModelManager.ENSEMBLE_NAME)
 
         self.dropdown_label = QLabel(
             f"<b>Model Information</b><br>" f"Name: --, --<br>" f"Dir: --, --"
@@ -183,6 +261,7 @@ class App(QMainWindow):
 
     def _connect_signals(self):
         self.search_bar.textChanged.connect(self._filter_patients)
+        self.quality_filter.currentIndexChanged.connect(self._filter_patients)
         self.patient_list.currentItemChanged.connect(self._on_patient_selected)
 
         # Buttons
@@ -192,6 +271,8 @@ class App(QMainWindow):
         self.btn_eval.clicked.connect(self._evaluate_patient)
         self.btn_grad.clicked.connect(self._load_patient_grad_cam)
         self.btn_view.clicked.connect(self._open_cam_pdf_external)
+        self.btn_similar.clicked.connect(self._find_similar_patients)
+        self.btn_cohort.clicked.connect(self._load_cohort_grad_cam)
 
         self.model_options.currentTextChanged.connect(self._on_model_changed)
 
@@ -205,12 +286,31 @@ class App(QMainWindow):
         filtered_patients = [
             p for p in self.data_manager.all_patients if search_text in p.lower()
         ]
+
+        quality_mode = self.quality_filter.currentText()
+        if quality_mode != "All patients":
+            filtered_patients = [
+                p for p in filtered_patients if self._quality_status(p) == quality_mode
+            ]
         self._update_patient_list(filtered_patients)
 
+    def _quality_status(self, patient: str) -> str:
+        """Flagged, Clean, or Unchecked when the scan has not checked it"""
+        quality_flags = self.data_manager.get_patient_quality(patient)
+        if quality_flags is None or UNCHECKED_FLAG in quality_flags:
+            return "Unchecked"
+        return "Flagged" if quality_flags else "Clean"
+
     def _update_patient_list(self, patients: List[str]):
         self.patient_list.clear()
         for patient in patients:
             self.patient_list.addItem(patient)
+            quality_flags = self.data_manager.get_patient_quality(patient)
+            if quality_flags:
+                item = self.patient_list.item(self.patient_list.count() - 1)
+                if UNCHECKED_FLAG not in quality_flags:
+                    item.setForeground(QColor(200, 0, 0))
+                item.setToolTip(f"Quality: {', '.join(quality_flags)}")
 
     def _update_patient_color(self, patient_name: str, status: str):
         for i in range(self.patient_list.count()):
@@ -235,19 +335,49 @@ class App(QMainWindow):
         if not self.selected_patient:
             return
 
-        # Load ECG data
-        ecg_data = self.data_manager.get_patient_data(self.selected_patient)
-        if ecg_data is None:
-            self._show_error(f"Could not load data for patient {self.selected_patient}")
+        # Supersede any pending load, only the latest selection is plotted
+        self._load_generation += 1
+        self.loader_pool.clear()
+        self.btn_eval.setEnabled(False)
+        self.btn_grad.setEnabled(False)
+        self.btn_view.setEnabled(False)
+        self.btn_similar.setEnabled(False)
+
+        worker = PatientLoadWorker(
+            data_manager=self.data_manager,
+            patient_id=self.selected_patient,
+            generation=self._load_generation,
+            is_current=self._is_current_load,
+        )
+        worker.signals.result.connect(self._on_patient_loaded)
+        worker.signals.error.connect(self._on_patient_load_error)
+        self.loader_pool.start(worker)
+
+    def _is_current_load(self, generation: int) -> bool:
+        return generation == self._load_generation
+
+    def _on_patient_loaded(self, result: dict):
+        if not self._is_current_load(result["generation"]):
             return
 
         # Plot ECG signal
-        self.plotter.plot_signal(ecg_data)
-        self._update_patient_labels()
-        self._update_patient_diagnostics()
+        self.current_long_recording = result["long_recording"]
+        if self.current_long_recording is not None:
+            self.plotter.plot_long_recording(self.current_long_recording)
+        else:
+            self.plotter.plot_signal(result["ecg_data"])
+        self.btn_similar.setEnabled(
+            self.current_long_recording is None and not self._embedding_running
+        )
+        self._update_patient_labels(result["true_label"])
+        self._update_patient_diagnostics(result["diagnostics"])
+
+    def _on_patient_load_error(self, generation: int, error_msg: str):
+        if not self._is_current_load(generation):
+            return
+        self._show_error(error_msg)
 
-    def _update_patient_labels(self):
-        true_label = self.data_manager.get_patient_label(self.selected_patient)
+    def _update_patient_labels(self, true_label: Optional[int] = None):
         self.btn_eval.setEnabled(True)
         if true_label is not None:
             label_text = self.data_manager.label_map.get(true_label, "Unknown")
@@ -261,8 +391,11 @@ class App(QMainWindow):
                 f"<b>Label Information</b><br>" f"Class: --, --<br>" f"Name: --, --"
             )
 
-    def _update_patient_diagnostics(self):
-        diagnostics = self.data_manager.get_patient_diagnostics(self.selected_patient)
+    def _update_patient_diagnostics(self, diagnostics: Optional[Dict] = None):
+        if diagnostics is None:
+            diagnostics = self.data_manager.get_patient_diagnostics(
+                self.selected_patient
+            )
 
         if diagnostics is None:
             return
@@ -282,15 +415,22 @@ class App(QMainWindow):
         rhythm_missing = pd.isna(diagnostics.get("Rhythm"))
         self.btn_eval.setEnabled(rhythm_missing)
         grad_value = diagnostics.get("Grad")
-        grad_ready = grad_value == 1
-        grad_missing = grad_value == 0 or pd.isna(grad_value)
+        cam_key = self.data_manager.get_cam_key(self.selected_patient)
+        # The flag is reset in the background, viewing never writes diagnostics
+        output_lost = grad_value == 1 and not self.cam_cache.has_pdf(cam_key)
+        grad_ready = grad_value == 1 and not output_lost
+        grad_missing = grad_value == 0 or pd.isna(grad_value) or output_lost
         self.btn_grad.setEnabled(grad_missing)
         self.btn_view.setEnabled(grad_ready)
-        self.btn_view.setToolTip(
-            "Grad-CAM ready to print for this patient."
-            if grad_ready
-            else "Grad-CAM not available."
-        )
+        if grad_ready:
+            self.btn_view.setToolTip("Grad-CAM ready to print for this patient.")
+        elif output_lost:
+            self.btn_view.setToolTip(
+                "Grad-CAM output is missing, it was removed to stay within the "
+                "cache quota. Generate it again."
+            )
+        else:
+            self.btn_view.setToolTip("Grad-CAM not available.")
 
     def _create_diagnostics_grid(self, columns: List[str]):
         if self.diag_grid_widget:
@@ -335,12 +475,37 @@ class App(QMainWindow):
             self._show_warning("No patient selected!")
             return
 
+        if self.data_manager.is_long_recording(self.selected_patient):
+            self._evaluate_long_recording()
+            return
+
         ecg_data = self.data_manager.get_patient_data(self.selected_patient)
         if ecg_data is None:
             self._show_warning("No patient data loaded!")
             return
 
-        predicted_class = self.model_manager.predict(ecg_data)
+        recording_hash = self.data_manager.get_patient_hash(self.selected_patient)
+        config = self.data_manager.get_preprocessing_config(self.selected_patient)
+        member_text = ""
+        if self.model_manager.is_ensemble():
+            result = self.model_manager.predict_ensemble(
+                np.expand_dims(ecg_data, axis=0),
+                [recording_hash] if recording_hash is not None else None,
+                config,
+            )
+            predicted_class = None
+            if result is not None:
+                combined, member_outputs = result
+                predicted_class = int(np.argmax(combined[0]))
+                member_text = "".join(
+                    f"<br>{name}: {int(np.argmax(probabilities[0]))}"
+                    for name, probabilities in member_outputs.items()
+                )
+        else:
+            predicted_class = self.model_manager.predict(
+                ecg_data, recording_hash, config
+            )
+
         if predicted_class is None:
             self._show_error("Prediction failed!")
             return
@@ -354,6 +519,84 @@ class App(QMainWindow):
             f"<b>Prediction Information</b><br>"
             f"Class: {predicted_class}<br>"
             f"Name: {self.current_prediction_text}"
+            f"{member_text}"
+        )
+
+        self.btn_save.setEnabled(True)
+
+    def _evaluate_long_recording(self):
+        recording = self.current_long_recording
+        if recording is None:
+            self._show_warning("No patient data loaded!")
+            return
+
+        if self._windows_running:
+            self._show_warning("Wait for the running long recording evaluation.")
+            return
+
+        # Windows are classified in the background, the model must not change
+        self._windows_running = True
+        self.btn_eval.setEnabled(False)
+        self.model_options.setEnabled(False)
+        worker = WindowPredictionWorker(
+            self.model_manager, recording, self.data_manager.preprocessor
+        )
+        worker.signals.progress.connect(
+            partial(self._on_windows_progress, self.selected_patient)
+        )
+        worker.signals.finished.connect(
+            partial(self._on_windows_finished, self.selected_patient)
+        )
+        worker.signals.error.connect(
+            partial(self._on_windows_error, self.selected_patient)
+        )
+        self.threadpool.start(worker)
+
+    def _end_window_run(self):
+        self._windows_running = False
+        self.model_options.setEnabled(not self._embedding_running)
+
+    def _on_windows_progress(self, patient_id: str, done: int, total: int):
+        if patient_id == self.selected_patient:
+            self.prediction_label.setText(
+                f"<b>Prediction Information</b><br>"
+                f"Classifying windows {done}/{total}..."
+            )
+
+    def _on_windows_error(self, patient_id: str, error_msg: str):
+        self._end_window_run()
+        if patient_id != self.selected_patient:
+            return
+        self.btn_eval.setEnabled(True)
+        self._reset_prediction_ui()
+        self._show_error(error_msg)
+
+    def _on_windows_finished(self, patient_id: str, result):
+        self._end_window_run()
+        if patient_id != self.selected_patient:
+            return
+
+        self.btn_eval.setEnabled(True)
+        window_starts, probabilities = result
+        window_classes = np.argmax(probabilities, axis=1)
+        counts = np.bincount(window_classes, minlength=probabilities.shape[1])
+        predicted_class = int(np.argmax(counts))
+
+        self.current_prediction = predicted_class
+        self.current_prediction_text = self.data_manager.label_map.get(
+            predicted_class, "Unknown"
+        )
+        timeline_text = "".join(
+            f"<br>{self.data_manager.label_map.get(c, c)}: {count} windows"
+            for c, count in enumerate(counts)
+            if count
+        )
+        self.prediction_label.setText(
+            f"<b>Prediction Information</b><br>"
+            f"Class: {predicted_class}<br>"
+            f"Name: {self.current_prediction_text}<br>"
+            f"Windows: {len(window_starts)}"
+            f"{timeline_text}"
         )
 
         self.btn_save.setEnabled(True)
@@ -363,6 +606,21 @@ class App(QMainWindow):
             self._show_warning("Select the patient first!")
             return
 
+        if self.model_manager.current_model is None:
+            self._show_warning("Grad-CAM needs a single model, select one first.")
+            return
+
+        if self.data_manager.is_long_recording(self.selected_patient):
+            self._show_warning("Grad-CAM is not available for long recordings.")
+            return
+
+        valid, message = self.model_manager.validate_model(
+            self.model_manager.current_model_name
+        )
+        if not valid:
+            self._show_warning(f"Grad-CAM is not available: {message}")
+            return
+
         diagnostics = self.data_manager.get_patient_diagnostics(self.selected_patient)
         rhythm = diagnostics.get("Rhythm") if diagnostics else None
 
@@ -372,16 +630,14 @@ class App(QMainWindow):
             )
             return
 
-        if isinstance(rhythm, int):
-            patient_label = rhythm
-        else:
-            label_map_rev = {v: k for k, v in self.data_manager.label_map.items()}
-            patient_label = label_map_rev.get(rhythm)
-            if patient_label is None:
-                self._show_warning(f"Could not convert Rhythm '{rhythm}' to label.")
-                return
+        patient_label = self._rhythm_to_label(rhythm)
+        if patient_label is None:
+            self._show_warning(f"Could not convert Rhythm '{rhythm}' to label.")
+            return
 
-        dir_path = pathlib.Path("src") / "Data" / "Cams" / self.selected_patient
+        dir_path = self.cam_cache.patient_dir(
+            self.data_manager.get_cam_key(self.selected_patient)
+        )
 
         dir_path.mkdir(parents=True, exist_ok=True)
 
@@ -390,12 +646,10 @@ class App(QMainWindow):
             self._show_warning("No patient data loaded!")
             return
 
-        patient_data = self.model_manager._min_max_normalize(patient_data)
-
         if patient_data.ndim == 3 and patient_data.shape[1] == 1:
             patient_data = np.squeeze(patient_data, axis=1)
 
-        patient_data = np.expand_dims(patient_data, axis=0)
+        patient_data = self.model_manager.prepare_input(patient_data)
 
         worker = GradCamWorker(
             model=self.model_manager.current_model,
@@ -420,15 +674,28 @@ class App(QMainWindow):
         self.loading_dialog.show()
         self.threadpool.start(worker)
 
+    def _rhythm_to_label(self, rhythm) -> Optional[int]:
+        if isinstance(rhythm, int):
+            return rhythm
+        label_map_rev = {v: k for k, v in self.data_manager.label_map.items()}
+        return label_map_rev.get(rhythm)
+
+    def _record_patient_cam(self, patient_id: str):
+        cam_key = self.data_manager.get_cam_key(patient_id)
+        if cam_key is None:
+            # Unmounted meanwhile, the next scan of the tree picks it up
+            return
+        self.cam_cache.record(cam_key)
+        self._update_patient_color(patient_id, "green")
+        self.data_manager.update_patient_grad(patient_id)
+
     def _on_grad_cam_finished(self, worker):
         patient_id = worker.patient_id
         patient_label = worker.patient_label
         dir_path = worker.dir_path
-        self._update_patient_color(patient_id, "green")
-        self.data_manager.update_patient_grad(patient_id)
-        self._update_patient_diagnostics()
-
         self.data_manager.get_patient_cam_imgs(dir_path, patient_id, patient_label)
+        self._record_patient_cam(patient_id)
+        self._update_patient_diagnostics()
         self.btn_grad.setToolTip("Grad-CAM already available for this patient.")
         self.btn_view.setToolTip("Grad-CAM ready to print for this patient.")
 
@@ -436,11 +703,200 @@ class App(QMainWindow):
         self.btn_grad.setEnabled(False)
         self.btn_view.setEnabled(True)
 
+    def _on_cam_evicted(self, cam_key: str):
+        patient_id = self.data_manager.get_patient_by_cam_key(cam_key)
+        if patient_id is None:
+            # Reset when its directory is mounted again
+            return
+        self._update_patient_color(patient_id, "default")
+        self._start_grad_reconcile(self.data_manager.get_patient_dir(patient_id))
+
+    def _start_grad_reconcile(self, dir_path: pathlib.Path):
+        """Reset the Grad flags of output that is gone, off the main loop"""
+        if dir_path in self._reconciling:
+            self._reconciling[dir_path] = True
+            return
+
+        self._reconciling[dir_path] = False
+        worker = CamReconcileWorker(self.data_manager, self.cam_cache, dir_path)
+        worker.signals.finished.connect(
+            lambda refs: self._on_grad_reconciled(dir_path, refs)
+        )
+        worker.signals.error.connect(lambda msg: self._on_grad_reconciled(dir_path, []))
+        self.threadpool.start(worker)
+
+    def _on_grad_reconciled(self, dir_path: pathlib.Path, refs: List[str]):
+        for patient_id in refs:
+            self._update_patient_color(patient_id, "default")
+        if self._reconciling.pop(dir_path, False):
+            self._start_grad_reconcile(dir_path)
+
     def _on_grad_cam_error(self, error_msg):
         self._show_error(f"Grad-CAM generation failed: {error_msg}")
         self.patient_list.setEnabled(True)
         self.btn_grad.setEnabled(True)
 
+    def _load_cohort_grad_cam(self):
+        if self.model_manager.current_model is None:
+            self._show_warning("Grad-CAM needs a single model, select one first.")
+            return
+
+        valid, message = self.model_manager.validate_model(
+            self.model_manager.current_model_name
+        )
+        if not valid:
+            self._show_warning(f"Grad-CAM is not available: {message}")
+            return
+
+        # The listed patients with a saved rhythm and no Grad-CAM yet
+        patient_labels = {}
+        for row in range(self.patient_list.count()):
+            patient_id = self.patient_list.item(row).text()
+            if self.cam_cache.has_pdf(self.data_manager.get_cam_key(patient_id)):
+                continue
+            if self.data_manager.is_long_recording(patient_id):
+                continue
+            diagnostics = self.data_manager.get_patient_diagnostics(patient_id)
+            rhythm = diagnostics.get("Rhythm") if diagnostics else None
+            if pd.isna(rhythm):
+                continue
+            patient_label = self._rhythm_to_label(rhythm)
+            if patient_label is not None:
+                patient_labels[patient_id] = patient_label
+
+        if not patient_labels:
+            self._show_info("No listed patient with a saved rhythm needs Grad-CAM.")
+            return
+
+        worker = CohortGradCamWorker(
+            model=self.model_manager.current_model,
+            data_manager=self.data_manager,
+            patient_labels=patient_labels,
+            cams_root=self.cam_cache.root,
+        )
+        worker.signals.patient_finished.connect(self._on_cohort_patient_finished)
+        worker.signals.finished.connect(self._on_cohort_grad_cam_finished)
+        worker.signals.error.connect(self._on_cohort_grad_cam_error)
+
+        self.patient_list.setEnabled(False)
+        self.btn_grad.setEnabled(False)
+        self.btn_cohort.setEnabled(False)
+        self.loading_dialog = LoadingDialog(parent=self)
+        worker.signals.log.connect(self.loading_dialog.append_log)
+        worker.signals.finished.connect(self.loading_dialog.accept)
+        worker.signals.error.connect(
+            lambda msg: self.loading_dialog.append_log(f"ERROR: {msg}")
+        )
+
+        self.loading_dialog.show()
+        self.threadpool.start(worker)
+
+    def _on_cohort_patient_finished(self, patient_id: str, patient_label: int):
+        self._record_patient_cam(patient_id)
+        if patient_id == self.selected_patient:
+            self._update_patient_diagnostics()
+
+    def _end_cohort_grad_cam(self):
+        self.patient_list.setEnabled(True)
+        self.btn_cohort.setEnabled(bool(self.data_manager.mounted_dirs))
+        if self.selected_patient is not None:
+            self._update_patient_diagnostics()
+
+    def _on_cohort_grad_cam_finished(self):
+        self._end_cohort_grad_cam()
+
+    def _on_cohort_grad_cam_error(self, error_msg: str):
+        self._end_cohort_grad_cam()
+        self._show_error(f"Grad-CAM generation failed: {error_msg}")
+
+    def _find_similar_patients(self):
+        if not self.selected_patient:
+            self._show_warning("Select the patient first!")
+            return
+
+        if self.model_manager.current_model is None:
+            self._show_warning(
+                "Similar patient search needs a single model, select one first."
+            )
+            return
+
+        if (
+            self.embedding_index is None
+            or self.embedding_index.model_hash != self.model_manager.current_model_hash
+        ):
+            self.embedding_index = EmbeddingIndex(
+                self.embedding_root, self.model_manager.current_model_hash
+            )
+
+        # Index new or changed recordings first, the model must not change meanwhile
+        self._embedding_running = True
+        self.btn_similar.setEnabled(False)
+        self.model_options.setEnabled(False)
+        worker = EmbeddingWorker(
+            self.model_manager,
+            self.data_manager,
+            self.embedding_index,
+            list(self.data_manager.all_patients),
+        )
+        worker.signals.progress.connect(
+            lambda done, total: self.btn_similar.setToolTip(
+                f"Indexing patients {done}/{total}..."
+            )
+        )
+        worker.signals.finished.connect(
+            partial(self._on_embeddings_finished, self.selected_patient)
+        )
+        worker.signals.error.connect(self._on_embeddings_error)
+        self.threadpool.start(worker)
+
+    def _end_embedding_run(self):
+        self._embedding_running = False
+        # Drop the embedding-sized input buffer, single predictions need far less
+        self.model_manager.release_input_buffer()
+        self.model_options.setEnabled(not self._windows_running)
+        self.btn_similar.setToolTip("Find patients with similar ECGs.")
+        self.btn_similar.setEnabled(
+            self.selected_patient is not None and self.current_long_recording is None
+        )
+
+    def _on_embeddings_finished(self, patient_id: str, indexed: int):
+        self._end_embedding_run()
+        if patient_id != self.selected_patient:
+            return
+
+        key = self.data_manager.get_patient_key(patient_id)
+        vector = self.embedding_index.get(key) if key is not None else None
+        if vector is None:
+            self._show_warning(f"Patient {patient_id} could not be indexed.")
+            return
+
+        results = self.embedding_index.query(
+            vector,
+            k=10,
+            exclude=[key],
+            dirs=[str(dir_path) for dir_path in self.data_manager.mounted_dirs],
+        )
+        if not results:
+            self._show_info("No other patients are indexed yet.")
+            return
+
+        lines = []
+        for dir_path, file_stem, score in results:
+            similar_patient = self.data_manager.get_patient_ref(dir_path, file_stem)
+            if similar_patient is None:
+                continue
+            label = self.data_manager.get_patient_label(similar_patient)
+            label_text = self.data_manager.label_map.get(label, "--")
+            lines.append(
+                f"{similar_patient} ({pathlib.Path(dir_path).name}): "
+                f"{score:.3f}, {label_text}"
+            )
+        self._show_info(f"Patients similar to {patient_id}:\n" + "\n".join(lines))
+
+    def _on_embeddings_error(self, error_msg: str):
+        self._end_embedding_run()
+        self._show_error(f"Similar patient search failed: {error_msg}")
+
     def _save_prediction(self):
         if not self.selected_patient or not self.current_prediction_text:
             self._show_warning("No prediction to save!")
@@ -466,29 +922,99 @@ class App(QMainWindow):
             return
 
         dir_path = pathlib.Path(directory).resolve()
-        success = self.data_manager.add_directory(dir_path)
+        success, message = self.data_manager.add_directory(dir_path)
 
         if success:
             self.search_bar.setEnabled(True)
-            self._update_patient_list(self.data_manager.all_patients)
-            self.btn_add.setEnabled(False)
+            self._refresh_patient_list()
             self.btn_remove.setEnabled(True)
+            self.btn_cohort.setEnabled(True)
+            patient_paths = self.data_manager.get_patient_paths(dir_path)
+            self.cam_cache.adopt_legacy(
+                dir_path, [path.stem for path in patient_paths.values()]
+            )
+            self._start_grad_reconcile(dir_path)
+            if self.scan_quality:
+                self._start_quality_scan(dir_path)
+            # Tell the user when duplicate names got qualified
+            if any(path.stem != p for p, path in patient_paths.items()):
+                self._show_info(message)
         else:
-            self._show_error("Failed to add directory.")
+            self._show_error(f"Failed to add directory: {message}")
 
-    def _remove_directories(self):
+    def _start_quality_scan(self, dir_path: pathlib.Path):
+        worker = QualityScanWorker(self.data_manager, dir_path)
+        worker.signals.finished.connect(self._on_quality_scan_finished)
+        worker.signals.error.connect(
+            lambda msg: print(f"Quality scan failed for {dir_path}: {msg}")
+        )
+        self.threadpool.start(worker)
+
+    def _on_quality_scan_finished(self, flags: Dict[str, List[str]]):
         if not self.data_manager.mounted_dirs:
+            return
+
+        self.quality_filter.setEnabled(True)
+        self._refresh_patient_list()
+
+    def _refresh_patient_list(self):
+        """Refilter the list without reloading the selected patient"""
+        current_item = self.patient_list.currentItem()
+        current_text = current_item.text() if current_item else None
+        self.patient_list.blockSignals(True)
+        self._filter_patients()
+        if current_text is not None:
+            matches = self.patient_list.findItems(current_text, Qt.MatchExactly)
+            if matches:
+                self.patient_list.setCurrentItem(matches[0])
+        self.patient_list.blockSignals(False)
+
+    def _remove_directories(self):
+        mounted_dirs = self.data_manager.mounted_dirs
+        if not mounted_dirs:
             self._show_info("No directories to remove.")
             return
 
-        self.data_manager.clear()
-        self._reset_ui()
+        if self._embedding_running:
+            self._show_warning("Wait for the similar patient search to finish.")
+            return
 
-        self.btn_add.setEnabled(True)
-        self.btn_remove.setEnabled(False)
-        self.search_bar.setEnabled(False)
+        dir_path = mounted_dirs[0]
+        if len(mounted_dirs) > 1:
+            choice, ok = QInputDialog.getItem(
+                self,
+                "Remove Directory",
+                "Directory to remove:",
+                [str(path) for path in mounted_dirs],
+                0,
+                False,
+            )
+            if not ok:
+                return
+            dir_path = pathlib.Path(choice)
 
-        self._show_info(f"Removed the directory.")
+        removes_selected = (
+            self.selected_patient is not None
+            and self.data_manager.get_patient_dir(self.selected_patient) == dir_path
+        )
+        if removes_selected:
+            self._load_generation += 1
+            self.loader_pool.clear()
+            self.loader_pool.waitForDone()
+
+        self.data_manager.remove_directory(dir_path)
+        if removes_selected:
+            self._reset_ui()
+        self._refresh_patient_list()
+
+        if not self.data_manager.mounted_dirs:
+            self.btn_remove.setEnabled(False)
+            self.btn_cohort.setEnabled(False)
+            self.search_bar.setEnabled(False)
+            self.quality_filter.setEnabled(False)
+            self.quality_filter.setCurrentIndex(0)
+
+        self._show_info(f"Removed the directory {dir_path}.")
 
     def _on_model_changed(self):
         selected_model = self.model_options.currentText()
@@ -496,6 +1022,30 @@ class App(QMainWindow):
         self._reset_prediction_ui()
 
     def _load_model(self, model_name: str):
+        if model_name == ModelManager.ENSEMBLE_NAME:
+            success = self.model_manager.load_ensemble()
+            if success:
+                members = ", ".join(self.model_manager.ensemble_models)
+                self.dropdown_label.setText(
+                    f"<b>Model Information</b><br>"
+                    f"Name: {model_name} ({self.model_manager.ensemble_mode})<br>"
+                    f"Members: {members}"
+                )
+            else:
+                self._show_error(f"Failed to load model: {model_name}")
+            return
+
+        if self.model_manager.get_model_metadata(model_name) is None:
+            # Without metadata nothing can be checked up front, the load decides
+            print(f"No metadata for model {model_name}, loading it unchecked.")
+        else:
+            valid, message = self.model_manager.validate_model(
+                model_name, required_layers=()
+            )
+            if not valid:
+                self._show_error(f"Failed to load model: {message}")
+                return
+
         success = self.model_manager.load_model(model_name)
 
         if success:
@@ -504,11 +1054,23 @@ class App(QMainWindow):
             self.dropdown_label.setText(
                 f"<b>Model Information</b><br>"
                 f"Name: {model_name}<br>"
-                f"Dir: {model_path}"
+                f"Dir: {model_path}<br>"
+                f"{self._model_summary(model_name)}"
             )
         else:
             self._show_error(f"Failed to load model: {model_name}")
 
+    def _model_summary(self, model_name: str) -> str:
+        metadata = self.model_manager.get_model_metadata(model_name)
+        if metadata is None:
+            return "Params: --, Input: --"
+
+        params = metadata["param_count"]
+        input_shape = metadata["input_shape"]
+        return (f"Params: {params:,}" if params is not None else "Params: --") + (
+            f", Input: {tuple(input_shape)}" if input_shape is not None else ""
+        )
+
     def _reset_prediction_ui(self):
         self.prediction_label.setText(
             f"<b>Prediction Information</b><br>" f"Class: --, --<br>" f"Name: --, --"
@@ -525,6 +1087,11 @@ class App(QMainWindow):
             f"<b>Label Information</b><br>" f"Class: --, --<br>" f"Name: --, --"
         )
         self.selected_patient = None
+        self.current_long_recording = None
+        self.btn_eval.setEnabled(False)
+        self.btn_grad.setEnabled(False)
+        self.btn_view.setEnabled(False)
+        self.btn_similar.setEnabled(False)
 
         # Clear diagnostics grid
         if self.diag_grid_widget:
@@ -556,15 +1123,15 @@ class App(QMainWindow):
             self._show_warning("No patient selected!")
             return
 
-        pdf_path = (
-            pathlib.Path("src") / "Data" / "Cams" / patient_id / f"{patient_id}.pdf"
-        )
+        cam_key = self.data_manager.get_cam_key(patient_id)
+        pdf_path = self.cam_cache.pdf_path(cam_key)
 
         if not pdf_path.exists():
             self._show_error("Grad-CAM PDF not found!")
             return
 
         try:
+            self.cam_cache.touch(cam_key)
             self.get_native_os(pdf_path)
         except Exception as e:
             self._show_error(f"Failed to open PDF: {e}")
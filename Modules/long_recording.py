@@ -0,0 +1,180 @@
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+from typing import Iterator, List, Optional, Tuple
+
+from Modules.prediction_cache import file_hash
+
+
+class LongRecording:
+    """Memory-mapped long recording with a min/max level-of-detail pyramid
+
+    The CSV is converted once to a float32 .npy file that is memory-mapped, so
+    only the samples that are actually read are paged in. Each pyramid level
+    keeps the min and max of every bin of the level below it, which is enough
+    to draw the exact signal envelope at any zoom.
+    """
+
+    CHUNK_ROWS = 200_000
+    BASE_FACTOR = 16
+    LEVEL_FACTOR = 4
+    MIN_LEVEL_BINS = 256
+
+    def __init__(
+        self,
+        csv_path: pathlib.Path,
+        cache_dir: pathlib.Path,
+        sampling_rate: float = 500.0,
+    ):
+        self.csv_path = pathlib.Path(csv_path)
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.sampling_rate = sampling_rate
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        recording_hash = file_hash(self.csv_path)
+        self.npy_path = self.cache_dir / f"{recording_hash}.npy"
+        if not self.npy_path.exists():
+            self._convert()
+        self.data = np.load(self.npy_path, mmap_mode="r")
+        self.levels = self._load_pyramid(recording_hash)
+
+    @property
+    def num_samples(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / self.sampling_rate
+
+    def _convert(self):
+        with open(self.csv_path, "rb") as f:
+            num_rows = sum(
+                chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 24), b"")
+            )
+        with open(self.csv_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                num_rows += 1
+
+        tmp_path = self.npy_path.with_suffix(".tmp.npy")
+        out = None
+        row = 0
+        for chunk in pd.read_csv(
+            self.csv_path, header=None, dtype=np.float32, chunksize=self.CHUNK_ROWS
+        ):
+            values = chunk.to_numpy()
+            if out is None:
+                out = np.lib.format.open_memmap(
+                    tmp_path,
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(num_rows, values.shape[1]),
+                )
+            out[row : row + len(values)] = values
+            row += len(values)
+        out.flush()
+        del out
+        # Blank trailing lines are not rows, trim if the count overshot
+        if row != num_rows:
+            data = np.load(tmp_path, mmap_mode="r")[:row]
+            np.save(self.npy_path, data)
+            del data
+            tmp_path.unlink()
+        else:
+            tmp_path.replace(self.npy_path)
+
+    def _load_pyramid(self, recording_hash: str) -> List[Tuple[int, np.ndarray]]:
+        """(decimation factor, (bins, 2, leads) min/max array) per level"""
+        levels = []
+        factor = self.BASE_FACTOR
+        source = None
+        while True:
+            level_path = self.cache_dir / f"{recording_hash}_lod{factor}.npy"
+            if not level_path.exists():
+                if source is None:
+                    level = self._reduce_samples(factor)
+                else:
+                    level = self._reduce_level(source, self.LEVEL_FACTOR)
+                np.save(level_path, level)
+            level = np.load(level_path, mmap_mode="r")
+            levels.append((factor, level))
+            if len(level) < self.MIN_LEVEL_BINS * self.LEVEL_FACTOR:
+                break
+            source = level
+            factor *= self.LEVEL_FACTOR
+        return levels
+
+    def _reduce_samples(self, factor: int) -> np.ndarray:
+        num_bins = self.num_samples // factor
+        level = np.empty((num_bins, 2, self.data.shape[1]), dtype=np.float32)
+        bins_per_chunk = max(1, self.CHUNK_ROWS // factor)
+        for start in range(0, num_bins, bins_per_chunk):
+            stop = min(num_bins, start + bins_per_chunk)
+            block = self.data[start * factor : stop * factor]
+            block = block.reshape(stop - start, -1, block.shape[-1])
+            level[start:stop, 0] = block.min(axis=1)
+            level[start:stop, 1] = block.max(axis=1)
+        return level
+
+    @staticmethod
+    def _reduce_level(level: np.ndarray, factor: int) -> np.ndarray:
+        num_bins = len(level) // factor
+        block = np.asarray(level[: num_bins * factor]).reshape(
+            num_bins, factor, 2, level.shape[-1]
+        )
+        return np.stack([block[:, :, 0].min(axis=1), block[:, :, 1].max(axis=1)], 1)
+
+    def get_view(
+        self, start: float, stop: float, max_points: int, lead: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Time (s) and amplitude of one lead between start and stop seconds
+
+        Raw samples are returned when they fit in max_points, otherwise the
+        finest pyramid level that does, as interleaved min/max pairs.
+        """
+        first = max(0, int(start * self.sampling_rate))
+        last = min(self.num_samples, int(np.ceil(stop * self.sampling_rate)) + 1)
+        if last - first <= max_points:
+            x = np.arange(first, last) / self.sampling_rate
+            return x, np.asarray(self.data[first:last, lead])
+
+        factor, level = self.levels[-1]
+        for level_factor, candidate in self.levels:
+            if (last - first) // level_factor * 2 <= max_points:
+                factor, level = level_factor, candidate
+                break
+
+        first_bin, last_bin = first // factor, min(len(level), last // factor + 1)
+        envelope = np.asarray(level[first_bin:last_bin, :, lead])
+        x = np.repeat(np.arange(first_bin, last_bin) * factor, 2) / self.sampling_rate
+        return x, envelope.reshape(-1)
+
+    def iter_windows(
+        self, window_samples: int, stride_samples: int, batch_size: int
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (window start samples, (batch, window, leads) copies) in order"""
+        starts = np.arange(0, self.num_samples - window_samples + 1, stride_samples)
+        for i in range(0, len(starts), batch_size):
+            batch_starts = starts[i : i + batch_size]
+            windows = np.stack(
+                [self.data[s : s + window_samples] for s in batch_starts]
+            )
+            yield batch_starts, windows
+
+
+def is_long_recording(csv_path: pathlib.Path, threshold_bytes: int) -> bool:
+    try:
+        return csv_path.stat().st_size > threshold_bytes
+    except OSError:
+        return False
+
+
+def open_long_recording(
+    csv_path: pathlib.Path, cache_dir: pathlib.Path, sampling_rate: float
+) -> Optional[LongRecording]:
+    try:
+        return LongRecording(csv_path, cache_dir, sampling_rate)
+    except Exception as e:
+        print(f"Failed to open long recording {csv_path}: {e}")
+        return None
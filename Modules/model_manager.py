@@ -1,22 +1,56 @@
 import os
-from typing import Dict, Optional
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
 import itertools
+import threading
 import pathlib
 import numpy as np
 import tensorflow as tf
+from Modules.prediction_cache import PredictionCache, file_hash
+from Modules.model_metadata import load_model_index
+from Modules.execution_profile import (
+    TUNED_PROFILE_NAME,
+    ExecutionProfile,
+    apply_profile,
+    autotune,
+    default_profiles,
+    load_tuned_profile,
+)
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
-# TODO, load the list of models first, instead of loading the model itself
-# it will reduce app loading time, tensorflow will load when model is loaded
+
 class ModelManager:
     """Manages model loading and prediction"""
 
-    def __init__(self, models_dir: str):
+    ENSEMBLE_NAME = "ensemble"
+
+    def __init__(
+        self,
+        models_dir: str,
+        cache_path: Optional[str] = None,
+        profile: str = "interactive",
+    ):
         self.models_dir = pathlib.Path(models_dir).resolve()
         self.model_paths: Dict[str, pathlib.Path] = {}
+        self.model_metadata: Dict[str, Dict] = {}
         self.current_model = None
         self.current_model_name = "--"
+        self.current_model_hash: Optional[str] = None
+        self.cache = PredictionCache(pathlib.Path(cache_path)) if cache_path else None
+        self.ensemble_models: Dict[str, tf.keras.Model] = {}
+        self.ensemble_mode = "mean"
+        self._ensemble_fn = None
+        self._embedding_models: Dict[str, tf.keras.Model] = {}
+        self._input_buffer: Optional[np.ndarray] = None
+        self._input_lock = threading.Lock()
+        self.profiles = default_profiles()
+        self.tuned_profile_path = self.models_dir / TUNED_PROFILE_NAME
+        tuned_profile = load_tuned_profile(self.tuned_profile_path)
+        if tuned_profile is not None:
+            self.profiles["batch"] = tuned_profile
+        self.current_profile: Optional[ExecutionProfile] = None
+        self._apply_profile(profile)
         self._load_model_files()
 
     def _load_model_files(self):
@@ -36,9 +70,76 @@ class ModelManager:
             if model_key not in self.model_paths:
                 self.model_paths[model_key] = model_file
 
+        metadata_map = load_model_index(self.models_dir, self.model_paths.values())
+        self.model_metadata = {
+            model_key: metadata_map[model_path.name]
+            for model_key, model_path in self.model_paths.items()
+            if model_path.name in metadata_map
+        }
+
+    def _apply_profile(self, profile_name: str) -> bool:
+        """Apply the thread settings of a named profile, once at startup
+
+        The profile holds for the life of the process. Its affinity and
+        niceness are left out, they would slow down the UI for good.
+        """
+        profile = self.profiles.get(profile_name)
+        if profile is None:
+            print(f"Unknown execution profile: {profile_name}")
+            return False
+
+        if not apply_profile(profile, placement=False):
+            return False
+        self.current_profile = profile
+        return True
+
+    def autotune(
+        self, batch_size: int = 32, iterations: int = 20
+    ) -> Optional[ExecutionProfile]:
+        """Find the fastest thread settings for the loaded model
+
+        The result replaces the batch profile and is saved next to the models.
+        """
+        model_path = self.model_paths.get(self.current_model_name.lower())
+        if model_path is None:
+            return None
+
+        profile = autotune(model_path, self.tuned_profile_path, batch_size, iterations)
+        if profile is not None:
+            self.profiles["batch"] = profile
+        return profile
+
     def get_available_models(self) -> list[str]:
         return list(self.model_paths.keys())
 
+    def get_model_metadata(self, model_name: str) -> Optional[Dict]:
+        return self.model_metadata.get(model_name.lower())
+
+    def validate_model(
+        self,
+        model_name: str,
+        input_shape: Tuple[int, ...] = (500, 12),
+        required_layers: Tuple[str, ...] = ("res_3_conv_2",),
+    ) -> tuple[bool, str]:
+        """Check a model against the data and Grad-CAM layer from its metadata"""
+        metadata = self.get_model_metadata(model_name)
+        if metadata is None:
+            return False, f"No metadata for model {model_name}"
+
+        if metadata["input_shape"] is not None and tuple(
+            metadata["input_shape"]
+        ) != tuple(input_shape):
+            return (
+                False,
+                f"Model {model_name} takes input shape "
+                f"{tuple(metadata['input_shape'])}, expected {tuple(input_shape)}",
+            )
+
+        missing = [name for name in required_layers if name not in metadata["layers"]]
+        if missing:
+            return False, f"Model {model_name} has no layer {', '.join(missing)}"
+        return True, ""
+
     def load_model(self, model_name: str) -> bool:
         model_key = model_name.lower()
         if model_key not in self.model_paths:
@@ -52,26 +153,308 @@ class ModelManager:
 
             self.current_model = tf.keras.models.load_model(str(model_path))
             self.current_model_name = model_name
+            metadata = self.model_metadata.get(model_key)
+            self.current_model_hash = (
+                metadata["hash"] if metadata is not None else file_hash(model_path)
+            )
+            self.ensemble_models = {}
+            self._ensemble_fn = None
+            self._embedding_models = {}
             return True
         except Exception as e:
             print(f"Failed to load model {model_name}: {e}")
             return False
 
-    def predict(self, data: np.ndarray) -> Optional[int]:
+    def load_ensemble(
+        self, model_names: Optional[List[str]] = None, mode: str = "mean"
+    ) -> bool:
+        """Fuse the given models, all by default, into one inference graph
+
+        mode is "mean" to average probabilities or "vote" for the share of
+        member votes per class.
+        """
+        if mode not in ("mean", "vote"):
+            print(f"Unknown ensemble mode: {mode}")
+            return False
+
+        model_keys = [name.lower() for name in (model_names or self.model_paths)]
+        if not model_keys or any(key not in self.model_paths for key in model_keys):
+            return False
+
+        input_shapes = {
+            tuple(self.model_metadata[key]["input_shape"])
+            for key in model_keys
+            if key in self.model_metadata
+            and self.model_metadata[key]["input_shape"] is not None
+        }
+        if len(input_shapes) > 1:
+            print(f"Ensemble members take different input shapes: {input_shapes}")
+            return False
+
+        try:
+            models = {
+                key: tf.keras.models.load_model(str(self.model_paths[key]))
+                for key in model_keys
+            }
+            input_shape = tuple(next(iter(models.values())).input_shape[1:])
+            for key, model in models.items():
+                if tuple(model.input_shape[1:]) != input_shape:
+                    print(f"Model {key} does not take input shape {input_shape}")
+                    return False
+
+            members = list(models.values())
+
+            @tf.function(
+                input_signature=[tf.TensorSpec((None, *input_shape), tf.float32)]
+            )
+            def fused(batch):
+                return tf.stack([model(batch, training=False) for model in members])
+
+            self.current_model = None
+            self._embedding_models = {}
+            self.current_model_name = self.ENSEMBLE_NAME
+            self.current_model_hash = hashlib.sha256(
+                "".join(
+                    [mode] + [file_hash(self.model_paths[key]) for key in model_keys]
+                ).encode()
+            ).hexdigest()
+            self.ensemble_models = models
+            self.ensemble_mode = mode
+            self._ensemble_fn = fused
+            return True
+        except Exception as e:
+            print(f"Failed to load ensemble {model_keys}: {e}")
+            return False
+
+    def is_ensemble(self) -> bool:
+        return self._ensemble_fn is not None
+
+    def predict_ensemble(
+        self,
+        batch: np.ndarray,
+        recording_hashes: Optional[List[str]] = None,
+        config: str = "",
+    ) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """Run every ensemble member on a batch in a single call
+
+        Returns the combined probabilities (batch, classes) and each member's
+        own probabilities. Members are cached individually, so a batch whose
+        members are all cached never reaches the graph. config is the
+        preprocessing fingerprint the batch was read with.
+        """
+        if self._ensemble_fn is None:
+            return None
+
+        model_keys = list(self.ensemble_models)
+        use_cache = self.cache is not None and recording_hashes is not None
+        outputs = None
+        if use_cache:
+            model_hashes = [file_hash(self.model_paths[key]) for key in model_keys]
+            cached = [
+                [self.cache.get(model_hash, h, config) for h in recording_hashes]
+                for model_hash in model_hashes
+            ]
+            if all(entry is not None for row in cached for entry in row):
+                outputs = np.array([[entry[1] for entry in row] for row in cached])
+
+        if outputs is None:
+            try:
+                with self._input_lock:
+                    outputs = self._ensemble_fn(self.prepare_batch(batch)).numpy()
+            except Exception:
+                return None
+
+            if use_cache:
+                for model_hash, member_outputs in zip(model_hashes, outputs):
+                    for recording_hash, probabilities in zip(
+                        recording_hashes, member_outputs
+                    ):
+                        self.cache.put(
+                            model_hash, recording_hash, probabilities, config
+                        )
+
+        if self.ensemble_mode == "vote":
+            votes = np.argmax(outputs, axis=-1)
+            combined = np.eye(outputs.shape[-1], dtype=np.float32)[votes].mean(axis=0)
+        else:
+            combined = outputs.mean(axis=0)
+        return combined, dict(zip(model_keys, outputs))
+
+    def predict(
+        self, data: np.ndarray, recording_hash: Optional[str] = None, config: str = ""
+    ) -> Optional[int]:
+        probabilities = self.predict_proba(data, recording_hash, config)
+        if probabilities is None:
+            return None
+        return int(np.argmax(probabilities))
+
+    def predict_proba(
+        self, data: np.ndarray, recording_hash: Optional[str] = None, config: str = ""
+    ) -> Optional[np.ndarray]:
+        """Class probabilities for one recording, served from the cache when possible"""
+        if self.is_ensemble():
+            result = self.predict_ensemble(
+                np.expand_dims(data, axis=0),
+                [recording_hash] if recording_hash is not None else None,
+                config,
+            )
+            return None if result is None else result[0][0]
+
         if self.current_model is None:
             return None
 
+        use_cache = self.cache is not None and recording_hash is not None
+        if use_cache:
+            cached = self.cache.get(self.current_model_hash, recording_hash, config)
+            if cached is not None:
+                return cached[1]
+
         try:
-            normalized_data = self._min_max_normalize(data)
-            input_data = np.expand_dims(normalized_data, axis=0)
-            prediction = self.current_model.predict(input_data, verbose=0)
-            return int(np.argmax(prediction))
+            with self._input_lock:
+                input_data = self.prepare_batch([data])
+                probabilities = self.current_model.predict(input_data, verbose=0)[0]
         except Exception:
             return None
 
+        if use_cache:
+            self.cache.put(
+                self.current_model_hash, recording_hash, probabilities, config
+            )
+        return probabilities
+
+    def predict_windows(
+        self,
+        recording,
+        preprocessor,
+        window_seconds: float = 10.0,
+        stride_seconds: Optional[float] = None,
+        batch_size: int = 64,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Classify a long recording over sliding windows
+
+        Every window is denoised and binned to the model input length in
+        batches. Returns the window start times in seconds and the class
+        probabilities per window. progress is called with (done, total)
+        windows after every batch.
+        """
+        if self.current_model is None and not self.is_ensemble():
+            return None
+
+        window_samples = int(window_seconds * recording.sampling_rate)
+        stride_seconds = stride_seconds or window_seconds
+        stride_samples = int(stride_seconds * recording.sampling_rate)
+        if window_samples <= 0 or stride_samples <= 0:
+            return None
+
+        total = max(0, (recording.num_samples - window_samples) // stride_samples + 1)
+        starts, probabilities = [], []
+        done = 0
+        try:
+            for batch_starts, windows in recording.iter_windows(
+                window_samples, stride_samples, batch_size
+            ):
+                windows = preprocessor.transform_batch(windows, recording.sampling_rate)
+                if self.is_ensemble():
+                    batch_probabilities = self.predict_ensemble(windows)[0]
+                else:
+                    with self._input_lock:
+                        batch_probabilities = self.current_model.predict(
+                            self.prepare_batch(windows), verbose=0
+                        )
+                starts.append(batch_starts / recording.sampling_rate)
+                probabilities.append(batch_probabilities)
+                done += len(batch_starts)
+                if progress is not None:
+                    progress(done, total)
+        except Exception as e:
+            print(f"Windowed prediction failed: {e}")
+            return None
+
+        if not starts:
+            return None
+        return np.concatenate(starts), np.concatenate(probabilities)
+
+    def extract_embeddings(
+        self, recordings, batch_size: int = 64, layer_name: Optional[str] = None
+    ) -> Optional[np.ndarray]:
+        """Penultimate layer outputs of the loaded model, one float32 row per recording
+
+        layer_name selects another layer, the sub-model is kept until the
+        model changes.
+        """
+        if self.current_model is None or len(recordings) == 0:
+            return None
+
+        try:
+            layer = (
+                self.current_model.get_layer(layer_name)
+                if layer_name is not None
+                else self.current_model.layers[-2]
+            )
+            embedding_model = self._embedding_models.get(layer.name)
+            if embedding_model is None:
+                embedding_model = tf.keras.Model(
+                    self.current_model.inputs, layer.output
+                )
+                self._embedding_models[layer.name] = embedding_model
+
+            embeddings = []
+            for start in range(0, len(recordings), batch_size):
+                with self._input_lock:
+                    batch = self.prepare_batch(recordings[start : start + batch_size])
+                    embeddings.append(embedding_model(batch, training=False).numpy())
+        except Exception as e:
+            print(f"Failed to extract embeddings: {e}")
+            return None
+
+        embeddings = np.concatenate(embeddings).astype(np.float32, copy=False)
+        return embeddings.reshape(len(embeddings), -1)
+
+    def prepare_batch(self, recordings) -> np.ndarray:
+        """Normalize recordings into the reusable float32 input buffer
+
+        The returned array is a view of the buffer, the next call overwrites it.
+        The buffer only grows, it stays as large as the largest batch seen
+        (256 recordings once the embedding worker has run) until
+        release_input_buffer() is called.
+        """
+        shape = (len(recordings), *recordings[0].shape)
+        buffer = self._input_buffer
+        if buffer is None or buffer.shape[1:] != shape[1:] or len(buffer) < shape[0]:
+            buffer = self._input_buffer = np.empty(shape, dtype=np.float32)
+
+        batch = buffer[: shape[0]]
+        for data, out in zip(recordings, batch):
+            self._min_max_normalize(data, out=out)
+        return batch
+
+    def input_buffer_bytes(self) -> int:
+        return 0 if self._input_buffer is None else self._input_buffer.nbytes
+
+    def release_input_buffer(self):
+        """Free the reusable input buffer, the next batch allocates a new one"""
+        with self._input_lock:
+            self._input_buffer = None
+
     @staticmethod
-    def _min_max_normalize(data: np.ndarray) -> np.ndarray:
+    def prepare_input(data: np.ndarray) -> np.ndarray:
+        """Normalize a recording the caller owns in place, as a batch of one"""
+        data = np.asarray(data, dtype=np.float32)
+        return ModelManager._min_max_normalize(data, out=data)[np.newaxis]
+
+    @staticmethod
+    def _min_max_normalize(
+        data: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        if out is None:
+            out = np.empty(data.shape, dtype=np.float32)
+
         min_val, max_val = np.min(data), np.max(data)
         if max_val - min_val == 0:
-            return np.zeros_like(data, dtype=np.float32)
-        return ((data - min_val) / (max_val - min_val)).astype(np.float32)
+            out.fill(0)
+            return out
+
+        np.subtract(data, min_val, out=out, casting="unsafe")
+        np.divide(out, max_val - min_val, out=out, casting="unsafe")
+        return out
@@ -0,0 +1,132 @@
+import json
+import h5py
+import pathlib
+import zipfile
+from typing import Dict, Iterable, List, Optional
+
+from Modules.prediction_cache import file_hash
+
+INDEX_NAME = "model_index.json"
+
+
+def _layer_shapes(config: Dict) -> tuple[Optional[List], Optional[List]]:
+    """Input and output shapes (without batch axis) from a functional config"""
+    layers = {layer["name"]: layer for layer in config.get("layers", [])}
+
+    input_shape = None
+    for layer in layers.values():
+        if layer["class_name"] == "InputLayer":
+            layer_config = layer["config"]
+            shape = layer_config.get("batch_shape") or layer_config.get(
+                "batch_input_shape"
+            )
+            if shape is not None:
+                input_shape = list(shape[1:])
+            break
+
+    output_shape = None
+    output_layers = config.get("output_layers") or []
+    if output_layers:
+        output_name = output_layers[0][0]
+        units = layers.get(output_name, {}).get("config", {}).get("units")
+        if units is not None:
+            output_shape = [units]
+    return input_shape, output_shape
+
+
+def _count_params(weights: h5py.File, group: str) -> Optional[int]:
+    if group not in weights:
+        return None
+
+    sizes = []
+    weights[group].visititems(
+        lambda name, obj: (
+            sizes.append(obj.size) if isinstance(obj, h5py.Dataset) else None
+        )
+    )
+    return int(sum(sizes))
+
+
+def extract_metadata(model_path: pathlib.Path) -> Dict:
+    """Read shapes, layers and parameter count straight from a model file
+
+    .keras archives are read through their config.json and weights file,
+    legacy .h5 files through their model_config attribute. TensorFlow is never
+    imported.
+    """
+    metadata = {"keras_version": None, "param_count": None}
+    if zipfile.is_zipfile(model_path):
+        with zipfile.ZipFile(model_path) as archive:
+            config = json.loads(archive.read("config.json"))
+            if "metadata.json" in archive.namelist():
+                metadata["keras_version"] = json.loads(
+                    archive.read("metadata.json")
+                ).get("keras_version")
+            if "model.weights.h5" in archive.namelist():
+                with archive.open("model.weights.h5") as weights_file:
+                    with h5py.File(weights_file, "r") as weights:
+                        metadata["param_count"] = _count_params(weights, "layers")
+    else:
+        with h5py.File(model_path, "r") as weights:
+            config = json.loads(weights.attrs["model_config"])
+            metadata["keras_version"] = weights.attrs.get("keras_version")
+            metadata["param_count"] = _count_params(weights, "model_weights")
+
+    model_config = config.get("config", {})
+    input_shape, output_shape = _layer_shapes(model_config)
+    stat = model_path.stat()
+    metadata.update(
+        {
+            "file": model_path.name,
+            "hash": file_hash(model_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "class_name": config.get("class_name"),
+            "input_shape": input_shape,
+            "output_shape": output_shape,
+            "layers": [layer["name"] for layer in model_config.get("layers", [])],
+        }
+    )
+    if isinstance(metadata["keras_version"], bytes):
+        metadata["keras_version"] = metadata["keras_version"].decode()
+    return metadata
+
+
+def load_model_index(
+    models_dir: pathlib.Path, model_paths: Iterable[pathlib.Path]
+) -> Dict[str, Dict]:
+    """Metadata per model file, extracted only for new or changed files"""
+    index_path = models_dir / INDEX_NAME
+    index: Dict[str, Dict] = {}
+    if index_path.exists():
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except Exception as e:
+            print(f"Failed to load model index {index_path}: {e}")
+
+    metadata_map = {}
+    changed = False
+    for model_path in model_paths:
+        entry = index.get(model_path.name)
+        stat = model_path.stat()
+        if (
+            entry is None
+            or entry.get("mtime_ns") != stat.st_mtime_ns
+            or entry.get("size") != stat.st_size
+        ):
+            try:
+                entry = extract_metadata(model_path)
+            except Exception as e:
+                print(f"Failed to read metadata of {model_path}: {e}")
+                continue
+            changed = True
+        metadata_map[model_path.name] = entry
+
+    if changed or set(metadata_map) != set(index):
+        try:
+            with open(index_path, "w") as f:
+                json.dump(metadata_map, f, indent=2)
+        except OSError as e:
+            print(f"Failed to save model index {index_path}: {e}")
+    return metadata_map
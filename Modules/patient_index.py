@@ -0,0 +1,94 @@
+import heapq
+import pathlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[pathlib.Path, str]
+
+
+class PatientIndex:
+    """Patients of every mounted directory, keyed by (directory, patient)
+
+    Each patient gets a reference string used by the rest of the app. It is
+    the file stem unless an earlier mount already provides that stem, then it
+    is qualified as "stem@label" with the directory's mount label. References
+    never change while their directory stays mounted.
+
+    Every directory keeps its own sorted reference list and the merged
+    listing is a k-way merge of those, so mounting or unmounting a directory
+    never re-sorts the others.
+    """
+
+    def __init__(self):
+        self.dir_refs: Dict[pathlib.Path, List[str]] = {}
+        self.mount_labels: Dict[pathlib.Path, str] = {}
+        self.keys: Dict[str, Key] = {}
+        self.refs: Dict[Key, str] = {}
+        self.patients: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, ref: str) -> bool:
+        return ref in self.keys
+
+    @property
+    def mounted_dirs(self) -> List[pathlib.Path]:
+        return list(self.dir_refs)
+
+    def _mount_label(self, dir_path: pathlib.Path) -> str:
+        labels = set(self.mount_labels.values())
+        base = dir_path.name or "root"
+        label, suffix = base, 2
+        while label in labels:
+            label = f"{base}-{suffix}"
+            suffix += 1
+        return label
+
+    def _merge(self):
+        self.patients = list(heapq.merge(*self.dir_refs.values()))
+
+    def mount(self, dir_path: pathlib.Path, patient_ids: Iterable[str]) -> List[str]:
+        """Add a directory's patients, returns their references"""
+        if dir_path in self.dir_refs:
+            return []
+
+        label = self._mount_label(dir_path)
+        refs = []
+        for patient_id in sorted(patient_ids):
+            ref = patient_id
+            if ref in self.keys:
+                ref = f"{patient_id}@{label}"
+            suffix = 2
+            while ref in self.keys:
+                ref = f"{patient_id}@{label}-{suffix}"
+                suffix += 1
+            self.keys[ref] = (dir_path, patient_id)
+            self.refs[(dir_path, patient_id)] = ref
+            refs.append(ref)
+
+        self.mount_labels[dir_path] = label
+        self.dir_refs[dir_path] = sorted(refs)
+        self._merge()
+        return refs
+
+    def unmount(self, dir_path: pathlib.Path) -> List[str]:
+        """Drop a directory's patients, returns their references"""
+        refs = self.dir_refs.pop(dir_path, [])
+        self.mount_labels.pop(dir_path, None)
+        for ref in refs:
+            self.refs.pop(self.keys.pop(ref), None)
+        self._merge()
+        return refs
+
+    def resolve(self, ref: str) -> Optional[Key]:
+        return self.keys.get(ref)
+
+    def ref(self, dir_path: pathlib.Path, patient_id: str) -> Optional[str]:
+        return self.refs.get((pathlib.Path(dir_path), patient_id))
+
+    def clear(self):
+        self.dir_refs.clear()
+        self.mount_labels.clear()
+        self.keys.clear()
+        self.refs.clear()
+        self.patients = []
@@ -0,0 +1,72 @@
+import traceback
+from typing import Callable
+from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
+
+
+class PatientLoadWorkerSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(int, str)
+
+
+class PatientLoadWorker(QRunnable):
+    """Worker class for patient loading, to prevent main loop blocking
+
+    Every selection gets a new generation; work for a superseded generation
+    is skipped and its result is never emitted.
+    """
+
+    def __init__(
+        self,
+        data_manager,
+        patient_id: str,
+        generation: int,
+        is_current: Callable[[int], bool],
+    ):
+        super().__init__()
+        self.data_manager = data_manager
+        self.patient_id = patient_id
+        self.generation = generation
+        self.is_current = is_current
+
+        self.signals = PatientLoadWorkerSignals()
+
+    def run(self):
+        if not self.is_current(self.generation):
+            return
+
+        try:
+            # Long recordings are memory-mapped rather than loaded
+            long_recording = self.data_manager.get_long_recording(self.patient_id)
+            ecg_data = None
+            if long_recording is None:
+                ecg_data = self.data_manager.get_patient_data(self.patient_id)
+            if ecg_data is None and long_recording is None:
+                self.signals.error.emit(
+                    self.generation,
+                    f"Could not load data for patient {self.patient_id}",
+                )
+                return
+
+            if not self.is_current(self.generation):
+                return
+
+            true_label = self.data_manager.get_patient_label(self.patient_id)
+            diagnostics = self.data_manager.get_patient_diagnostics(self.patient_id)
+
+            if not self.is_current(self.generation):
+                return
+
+            self.signals.result.emit(
+                {
+                    "generation": self.generation,
+                    "patient_id": self.patient_id,
+                    "ecg_data": ecg_data,
+                    "long_recording": long_recording,
+                    "true_label": true_label,
+                    "diagnostics": diagnostics,
+                }
+            )
+        except Exception as e:
+            print(f"Patient load error: {e}")
+            print(f"Traceback: {traceback.format_exc()}")
+            self.signals.error.emit(self.generation, str(e))
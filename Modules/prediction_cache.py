@@ -0,0 +1,190 @@
+import sys
+import sqlite3
+import hashlib
+import pathlib
+import argparse
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+_hash_memo: Dict[pathlib.Path, Tuple[int, int, str]] = {}
+
+
+def file_hash(path: pathlib.Path) -> str:
+    """sha256 of a file's content, memoized on (mtime, size)"""
+    path = pathlib.Path(path).resolve()
+    stat = path.stat()
+    memo = _hash_memo.get(path)
+    if memo is not None and memo[:2] == (stat.st_mtime_ns, stat.st_size):
+        return memo[2]
+
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    _hash_memo[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+class PredictionCache:
+    """SQLite cache of predictions keyed by (model hash, recording hash, config)
+
+    config fingerprints the preprocessing a recording was read with, so raw
+    recordings are predicted again after the preprocessing changes. Hit and
+    miss counters are kept in memory and written on stats() and close().
+    """
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._hits = 0
+        self._misses = 0
+        columns = [
+            row[1] for row in self._conn.execute("PRAGMA table_info(predictions)")
+        ]
+        with self._conn:
+            if columns and "config" not in columns:
+                # Entries from before the config key, they are recomputed on demand
+                self._conn.execute("DROP TABLE predictions")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "model_hash TEXT NOT NULL, "
+                "recording_hash TEXT NOT NULL, "
+                "config TEXT NOT NULL, "
+                "predicted_class INTEGER NOT NULL, "
+                "probabilities BLOB NOT NULL, "
+                "PRIMARY KEY (model_hash, recording_hash, config))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)"
+            )
+
+    def get(
+        self, model_hash: str, recording_hash: str, config: str = ""
+    ) -> Optional[Tuple[int, np.ndarray]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT predicted_class, probabilities FROM predictions "
+                "WHERE model_hash = ? AND recording_hash = ? AND config = ?",
+                (model_hash, recording_hash, config),
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+
+        if row is None:
+            return None
+        return int(row[0]), np.frombuffer(row[1], dtype=np.float32).copy()
+
+    def put(
+        self,
+        model_hash: str,
+        recording_hash: str,
+        probabilities: np.ndarray,
+        config: str = "",
+    ):
+        probabilities = np.asarray(probabilities, dtype=np.float32).ravel()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                (
+                    model_hash,
+                    recording_hash,
+                    config,
+                    int(np.argmax(probabilities)),
+                    probabilities.tobytes(),
+                ),
+            )
+
+    def invalidate(
+        self, model_hash: Optional[str] = None, recording_hash: Optional[str] = None
+    ) -> int:
+        """Drop cached predictions, all of them when no hash is given"""
+        query = "DELETE FROM predictions"
+        clauses, params = [], []
+        if model_hash is not None:
+            clauses.append("model_hash = ?")
+            params.append(model_hash)
+        if recording_hash is not None:
+            clauses.append("recording_hash = ?")
+            params.append(recording_hash)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        with self._lock, self._conn:
+            return self._conn.execute(query, params).rowcount
+
+    def _flush_stats(self):
+        """Add the in-memory counters to the stored ones, the lock must be held"""
+        if self._hits or self._misses:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE stats SET value = value + ? WHERE name = ?",
+                    [(self._hits, "hits"), (self._misses, "misses")],
+                )
+            self._hits = self._misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._flush_stats()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats"))
+            entries = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "entries": entries,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock, self._conn:
+            self._hits = self._misses = 0
+            self._conn.execute("UPDATE stats SET value = 0")
+
+    def close(self):
+        with self._lock:
+            self._flush_stats()
+            self._conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the prediction cache.")
+    parser.add_argument(
+        "--db",
+        default=str(pathlib.Path("src") / "Data" / "Cache" / "predictions.sqlite"),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show cache size and hit rate.")
+    invalidate = commands.add_parser("invalidate", help="Drop cached predictions.")
+    invalidate.add_argument("--model", help="Model file whose entries are dropped.")
+    invalidate.add_argument("--recording", help="Recording whose entries are dropped.")
+    args = parser.parse_args(argv)
+
+    cache = PredictionCache(pathlib.Path(args.db))
+    try:
+        if args.command == "stats":
+            stats = cache.stats()
+            print(
+                f"Entries: {stats['entries']}, hits: {stats['hits']}, "
+                f"misses: {stats['misses']}, hit rate: {stats['hit_rate']:.1%}"
+            )
+        else:
+            removed = cache.invalidate(
+                model_hash=file_hash(args.model) if args.model else None,
+                recording_hash=file_hash(args.recording) if args.recording else None,
+            )
+            print(f"Removed {removed} cached predictions.")
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import hashlib
+import pathlib
+import numpy as np
+from scipy import signal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def read_sampling_rate(data_path: pathlib.Path) -> Optional[float]:
+    """Sampling rate from the WFDB header next to a recording, if there is one
+
+    PhysioNet exports describe each recording in <name>.hea, whose first line
+    reads "<name> <leads> <rate>[/<counter rate>][(<base>)] <samples> ...".
+    """
+    header_path = data_path.with_suffix(".hea")
+    try:
+        with open(header_path) as f:
+            fields = f.readline().split()
+        return float(fields[2].split("/")[0].split("(")[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class SignalPreprocessor:
+    """Denoises and time-bins raw recordings to the model input length"""
+
+    def __init__(
+        self,
+        sampling_rate: float = 500.0,
+        target_length: int = 500,
+        low_hz: float = 0.5,
+        high_hz: float = 40.0,
+        order: int = 4,
+        cache_dir: Optional[pathlib.Path] = None,
+    ):
+        self.sampling_rate = sampling_rate
+        self.target_length = target_length
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.order = order
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+        self.config_hash = self._config_hash(sampling_rate)
+
+    def _config_hash(self, sampling_rate: float) -> str:
+        return hashlib.sha256(
+            repr(
+                (
+                    sampling_rate,
+                    self.target_length,
+                    self.low_hz,
+                    self.high_hz,
+                    self.order,
+                )
+            ).encode()
+        ).hexdigest()[:12]
+
+    def fingerprint(self, sampling_rate: Optional[float] = None) -> str:
+        """Hash of the band, bin size and rate a recording is preprocessed with"""
+        return self._config_hash(sampling_rate or self.sampling_rate)
+
+    def needs_preprocessing(self, data: np.ndarray) -> bool:
+        return data.shape[0] != self.target_length
+
+    def transform(
+        self, data: np.ndarray, sampling_rate: Optional[float] = None
+    ) -> np.ndarray:
+        return self.transform_batch(data[np.newaxis], sampling_rate)[0]
+
+    def transform_batch(
+        self, batch: np.ndarray, sampling_rate: Optional[float] = None
+    ) -> np.ndarray:
+        """(recordings, samples, leads) -> (recordings, target_length, leads)"""
+        fs = sampling_rate or self.sampling_rate
+        filtered = self._band_pass(np.asarray(batch, dtype=np.float64), fs)
+        return self._time_bin(filtered).astype(np.float32)
+
+    def transform_many(
+        self,
+        recordings: Sequence[np.ndarray],
+        sampling_rates: Optional[Sequence[float]] = None,
+    ) -> List[np.ndarray]:
+        """Transform recordings of mixed length, one vectorized pass per shape"""
+        if sampling_rates is None:
+            sampling_rates = [self.sampling_rate] * len(recordings)
+        sampling_rates = [fs or self.sampling_rate for fs in sampling_rates]
+
+        groups: Dict[Tuple[tuple, float], List[int]] = {}
+        for i, (data, fs) in enumerate(zip(recordings, sampling_rates)):
+            groups.setdefault((data.shape, fs), []).append(i)
+
+        results: List[Optional[np.ndarray]] = [None] * len(recordings)
+        for (_, fs), indices in groups.items():
+            batch = np.stack([recordings[i] for i in indices])
+            for i, processed in zip(indices, self.transform_batch(batch, fs)):
+                results[i] = processed
+        return results
+
+    def transform_cached(
+        self,
+        data: np.ndarray,
+        recording_hash: str,
+        sampling_rate: Optional[float] = None,
+    ) -> np.ndarray:
+        """Transform one recording, reusing the result stored for its hash"""
+        fs = sampling_rate or self.sampling_rate
+        if self.cache_dir is None:
+            return self.transform(data, fs)
+
+        cache_path = self.cache_dir / f"{recording_hash}_{self._config_hash(fs)}.npy"
+        if cache_path.exists():
+            try:
+                return np.load(cache_path)
+            except Exception:
+                pass
+
+        processed = self.transform(data, fs)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.save(cache_path, processed)
+        except OSError as e:
+            print(f"Failed to cache preprocessed recording {cache_path}: {e}")
+        return processed
+
+    def _band_pass(self, batch: np.ndarray, fs: float) -> np.ndarray:
+        high_hz = min(self.high_hz, 0.99 * fs / 2)
+        sos = signal.butter(
+            self.order, [self.low_hz, high_hz], btype="bandpass", fs=fs, output="sos"
+        )
+        # sosfiltfilt needs more samples than its default edge padding
+        if batch.shape[1] <= 3 * (2 * len(sos) + 1):
+            return batch
+        return signal.sosfiltfilt(sos, batch, axis=1)
+
+    def _time_bin(self, batch: np.ndarray) -> np.ndarray:
+        length = batch.shape[1]
+        if length == self.target_length:
+            return batch
+
+        if length < self.target_length:
+            positions = np.linspace(0, length - 1, self.target_length)
+            left = np.floor(positions).astype(int)
+            right = np.minimum(left + 1, length - 1)
+            weight = (positions - left)[np.newaxis, :, np.newaxis]
+            return batch[:, left] * (1 - weight) + batch[:, right] * weight
+
+        # Average consecutive samples into target_length bins
+        edges = np.linspace(0, length, self.target_length + 1).astype(int)
+        sums = np.add.reduceat(batch, edges[:-1], axis=1)
+        return sums / np.diff(edges)[np.newaxis, :, np.newaxis]
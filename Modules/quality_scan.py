@@ -0,0 +1,184 @@
+import os
+import json
+import pathlib
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from Modules.execution_profile import ExecutionProfile, apply_placement
+
+QUALITY_FLAGS = (
+    "unreadable",
+    "bad_shape",
+    "non_finite",
+    "flat_lead",
+    "saturated_lead",
+    "amplitude_outlier",
+)
+
+# Given to recordings the scan skipped, e.g. long recordings over max_bytes
+UNCHECKED_FLAG = "unchecked"
+
+INDEX_NAME = "Quality_Index.json"
+
+# A lead is saturated when this share of its samples sits on its extremes
+SATURATION_FRACTION = 0.2
+# A lead is an outlier when its peak-to-peak exceeds the record's median this much
+OUTLIER_RATIO = 10.0
+
+
+def check_batch(batch: np.ndarray) -> Dict[str, np.ndarray]:
+    """Quality checks for a (recordings, samples, leads) batch, one bool per recording"""
+    finite = np.isfinite(batch)
+    non_finite = ~finite.all(axis=(1, 2))
+    clean = np.where(finite, batch, 0)
+
+    lead_min = clean.min(axis=1, keepdims=True)
+    lead_max = clean.max(axis=1, keepdims=True)
+    ptp = (lead_max - lead_min)[:, 0]
+    flat = ptp == 0
+
+    at_extremes = ((clean == lead_min) | (clean == lead_max)).mean(axis=1)
+    saturated = (at_extremes > SATURATION_FRACTION) & ~flat
+
+    median_ptp = np.median(ptp, axis=1, keepdims=True)
+    outlier = (median_ptp > 0) & (ptp > OUTLIER_RATIO * median_ptp)
+
+    return {
+        "non_finite": non_finite,
+        "flat_lead": flat.any(axis=1),
+        "saturated_lead": saturated.any(axis=1),
+        "amplitude_outlier": outlier.any(axis=1),
+    }
+
+
+def _scan_chunk(
+    paths: List[str], expected_length: Optional[int], expected_leads: int
+) -> List[Tuple[str, List[str]]]:
+    """Load a chunk of recordings and check every group of equal shape at once"""
+    # Imported here, data_manager itself depends on this module
+    from Modules.data_manager import DataManager
+
+    flags: Dict[str, List[str]] = {}
+    groups: Dict[tuple, List[Tuple[str, np.ndarray]]] = {}
+    for path in paths:
+        patient_id = pathlib.Path(path).stem
+        data = DataManager.read_signal(pathlib.Path(path))
+        if data is None:
+            flags[patient_id] = ["unreadable"]
+            continue
+
+        flags[patient_id] = []
+        if (
+            data.ndim != 2
+            or data.shape[0] == 0
+            or data.shape[1] != expected_leads
+            or (expected_length is not None and data.shape[0] != expected_length)
+        ):
+            flags[patient_id].append("bad_shape")
+            if data.ndim != 2 or data.size == 0:
+                continue
+        groups.setdefault(data.shape, []).append((patient_id, data))
+
+    for members in groups.values():
+        results = check_batch(np.stack([data for _, data in members]))
+        for i, (patient_id, _) in enumerate(members):
+            flags[patient_id].extend(name for name, hit in results.items() if hit[i])
+
+    return list(flags.items())
+
+
+class QualityIndex:
+    """Per-directory quality flags, persisted and rescanned only for changed files"""
+
+    def __init__(self, dir_path: pathlib.Path):
+        self.dir_path = dir_path
+        self.index_path = dir_path / INDEX_NAME
+        self.entries: Dict[str, Dict] = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path) as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Failed to load quality index {self.index_path}: {e}")
+
+    def scan(
+        self,
+        expected_length: Optional[int] = 500,
+        expected_leads: int = 12,
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+        max_bytes: Optional[int] = None,
+        profile: Optional[ExecutionProfile] = None,
+    ) -> Dict[str, List[str]]:
+        """Flags per patient, files larger than max_bytes are flagged unchecked
+
+        Entries are reused while the file's mtime and size and the expected
+        shape match, so changing the expected shape rechecks every file. With
+        a profile, the scan processes are pinned and reniced by it and
+        default to its core count.
+        """
+        stats = {p.stem: p.stat() for p in self.dir_path.glob("*.csv")}
+        params = {"expected_length": expected_length, "expected_leads": expected_leads}
+        unchecked = {
+            patient_id
+            for patient_id, stat in stats.items()
+            if max_bytes is not None and stat.st_size > max_bytes
+        }
+        stale = [
+            patient_id
+            for patient_id, stat in stats.items()
+            if patient_id not in unchecked
+            and not self._is_current(patient_id, stat, params)
+        ]
+        for patient_id in set(self.entries) - set(stats):
+            del self.entries[patient_id]
+
+        if stale:
+            paths = [str(self.dir_path / f"{patient_id}.csv") for patient_id in stale]
+            chunks = [
+                paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)
+            ]
+            if profile is not None:
+                workers = workers or profile.cpu_count
+            with ProcessPoolExecutor(
+                max_workers=min(workers or os.cpu_count() or 1, len(chunks)),
+                mp_context=mp.get_context("spawn"),
+                initializer=apply_placement if profile is not None else None,
+                initargs=(profile,) if profile is not None else (),
+            ) as executor:
+                futures = [
+                    executor.submit(_scan_chunk, chunk, expected_length, expected_leads)
+                    for chunk in chunks
+                ]
+                for future in futures:
+                    for patient_id, flags in future.result():
+                        stat = stats[patient_id]
+                        self.entries[patient_id] = {
+                            "mtime_ns": stat.st_mtime_ns,
+                            "size": stat.st_size,
+                            **params,
+                            "flags": flags,
+                        }
+            self._save()
+
+        flags = {p: entry["flags"] for p, entry in self.entries.items()}
+        flags.update((patient_id, [UNCHECKED_FLAG]) for patient_id in unchecked)
+        return flags
+
+    def _is_current(self, patient_id: str, stat: os.stat_result, params: Dict) -> bool:
+        entry = self.entries.get(patient_id)
+        if entry is None:
+            return False
+        expected = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, **params}
+        return all(entry.get(name) == value for name, value in expected.items())
+
+    def _save(self):
+        try:
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            tmp_path.replace(self.index_path)
+        except OSError as e:
+            print(f"Failed to save quality index {self.index_path}: {e}")
@@ -0,0 +1,27 @@
+import traceback
+from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
+
+
+class QualityScanWorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+
+class QualityScanWorker(QRunnable):
+    """Worker class for the quality scan, to prevent main loop blocking"""
+
+    def __init__(self, data_manager, dir_path):
+        super().__init__()
+        self.data_manager = data_manager
+        self.dir_path = dir_path
+
+        self.signals = QualityScanWorkerSignals()
+
+    def run(self):
+        try:
+            flags = self.data_manager.scan_quality(self.dir_path)
+            self.signals.finished.emit(flags)
+        except Exception as e:
+            print(f"Quality scan error: {e}")
+            print(f"Traceback: {traceback.format_exc()}")
+            self.signals.error.emit(str(e))
@@ -0,0 +1,209 @@
+"""Headless UI latency harness
+
+Runs gui.App under the offscreen Qt platform against a synthetic dataset and
+replays user actions through the real slots, recording how long each action
+blocks the event loop. The app's caches and Grad-CAM output go to a temporary
+directory, so a run leaves src/Data untouched. Run from the repository root:
+
+    python -m Modules.ui_latency --patients 5000 --budget-ms 100
+"""
+
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import sys
+import time
+import pathlib
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+
+import Modules.gui as gui
+
+
+def make_synthetic_dataset(
+    dir_path: pathlib.Path, num_patients: int, seed: int = 0
+) -> List[str]:
+    """Write CSV recordings, Label_Map.xlsx and Diagnostics.xlsx like the real data"""
+    rng = np.random.default_rng(seed)
+    dir_path.mkdir(parents=True, exist_ok=True)
+    patients = [f"MUSE_{i:08d}" for i in range(num_patients)]
+    time_axis = np.linspace(0, 20 * np.pi, 500)[:, np.newaxis]
+    for patient_id in patients:
+        signal = np.sin(time_axis * rng.uniform(0.5, 2.0, 12)) * 100
+        signal += rng.normal(scale=5, size=signal.shape)
+        np.savetxt(dir_path / f"{patient_id}.csv", signal, delimiter=",", fmt="%.3f")
+
+    pd.DataFrame(
+        {"FileName": patients, "Rhythm": rng.integers(0, 4, num_patients)}
+    ).to_excel(dir_path / "Label_Map.xlsx", index=False)
+    pd.DataFrame(
+        {
+            "FileName": patients,
+            "Rhythm": [None] * num_patients,
+            "Grad": [0] * num_patients,
+            "PatientAge": rng.integers(20, 90, num_patients),
+            "Gender": rng.choice(["MALE", "FEMALE"], num_patients),
+        }
+    ).to_excel(dir_path / "Diagnostics.xlsx", index=False)
+    return patients
+
+
+class Heartbeat(QObject):
+    """Measures the longest gap between ticks of a 1 ms timer"""
+
+    def __init__(self):
+        super().__init__()
+        self.timer = QTimer(self)
+        self.timer.setInterval(1)
+        self.timer.timeout.connect(self._tick)
+        self.last_tick = time.perf_counter()
+        self.max_gap = 0.0
+        self.timer.start()
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.max_gap = max(self.max_gap, now - self.last_tick)
+        self.last_tick = now
+
+    def reset(self):
+        self.last_tick = time.perf_counter()
+        self.max_gap = 0.0
+
+
+class LatencyHarness:
+    """Replays actions against an App and records event-loop blocking per action"""
+
+    def __init__(
+        self, app: QApplication, dataset_dir: pathlib.Path, data_root: pathlib.Path
+    ):
+        self.app = app
+        self.dataset_dir = dataset_dir
+        self.messages: List[str] = []
+        self._patch_dialogs()
+        self.window = gui.App(data_root=data_root)
+        self.heartbeat = Heartbeat()
+        self.records: List[Tuple[str, float]] = []
+
+    def _patch_dialogs(self):
+        QFileDialog.getExistingDirectory = staticmethod(
+            lambda *args, **kwargs: str(self.dataset_dir)
+        )
+        for name in ("critical", "warning", "information"):
+            setattr(
+                QMessageBox,
+                name,
+                staticmethod(
+                    lambda parent, title, text, *a: self.messages.append(text)
+                ),
+            )
+
+    def _settle(self, timeout: float = 30.0):
+        """Process events until background loads have delivered their results"""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.app.processEvents()
+            if self.window.loader_pool.activeThreadCount() == 0:
+                self.app.processEvents()
+                return
+            time.sleep(0.001)
+
+    def measure(self, name: str, action: Callable[[], None]):
+        self._settle()
+        self.heartbeat.reset()
+        start_time = time.perf_counter()
+        action()
+        blocking = time.perf_counter() - start_time
+        self._settle()
+        self.records.append((name, max(blocking, self.heartbeat.max_gap) * 1000))
+
+    def run(self, actions: List[str]):
+        for action in actions:
+            kind, _, arg = action.partition(":")
+            if kind == "add":
+                self.measure("add_directory", self.window._add_directory)
+            elif kind == "select":
+                for row in range(min(int(arg or 1), self.window.patient_list.count())):
+                    self.measure(
+                        "patient_selected",
+                        lambda row=row: self.window.patient_list.setCurrentRow(row),
+                    )
+            elif kind == "search":
+                for i in range(len(arg) + 1):
+                    self.measure(
+                        "filter_patients",
+                        lambda text=arg[:i]: self.window.search_bar.setText(text),
+                    )
+            elif kind == "evaluate":
+                for _ in range(int(arg or 1)):
+                    self.measure("evaluate_patient", self.window._evaluate_patient)
+            else:
+                raise ValueError(f"Unknown action: {action}")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for name in dict.fromkeys(name for name, _ in self.records):
+            values = np.array([ms for n, ms in self.records if n == name])
+            summary[name] = {
+                "count": len(values),
+                "mean_ms": float(values.mean()),
+                "p95_ms": float(np.percentile(values, 95)),
+                "max_ms": float(values.max()),
+            }
+        return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure GUI event-loop blocking.")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument(
+        "--actions",
+        nargs="+",
+        default=["add", "select:50", "search:0001", "search:", "evaluate:5"],
+        help="Sequence of add, select:N, search:TEXT and evaluate:N.",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="Fail when the p95 of any action exceeds this budget.",
+    )
+    parser.add_argument("--dataset", help="Existing dataset directory to mount.")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = pathlib.Path(tmp_dir)
+        dataset_dir = pathlib.Path(args.dataset or tmp_path / "Dataset").resolve()
+        if not args.dataset:
+            print(f"Generating {args.patients} synthetic patients...")
+            make_synthetic_dataset(dataset_dir, args.patients)
+
+        harness = LatencyHarness(app, dataset_dir, tmp_path / "Data")
+        harness.run(args.actions)
+        summary = harness.summary()
+        # Background scans write into the temporary directory, let them finish
+        harness.window.threadpool.waitForDone()
+        harness.window.close()
+
+    failed = False
+    for name, stats in summary.items():
+        over_budget = args.budget_ms is not None and stats["p95_ms"] > args.budget_ms
+        failed = failed or over_budget
+        print(
+            f"{name:<18} n={stats['count']:<5} mean={stats['mean_ms']:8.1f} ms "
+            f"p95={stats['p95_ms']:8.1f} ms max={stats['max_ms']:8.1f} ms"
+            + ("  OVER BUDGET" if over_budget else "")
+        )
+    for message in harness.messages:
+        print(f"Dialog: {message}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import traceback
+from PyQt5.QtCore import QRunnable, pyqtSignal, QObject
+
+
+class WindowPredictionWorkerSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+
+class WindowPredictionWorker(QRunnable):
+    """Worker class for long recording classification, to prevent main loop blocking"""
+
+    def __init__(self, model_manager, recording, preprocessor):
+        super().__init__()
+        self.model_manager = model_manager
+        self.recording = recording
+        self.preprocessor = preprocessor
+
+        self.signals = WindowPredictionWorkerSignals()
+
+    def run(self):
+        try:
+            result = self.model_manager.predict_windows(
+                self.recording, self.preprocessor, progress=self.signals.progress.emit
+            )
+            if result is None:
+                self.signals.error.emit("Prediction failed!")
+                return
+            self.signals.finished.emit(result)
+        except Exception as e:
+            print(f"Windowed prediction error: {e}")
+            print(f"Traceback: {traceback.format_exc()}")
+            self.signals.error.emit(str(e))
@@ -3,7 +3,7 @@
 set -e
 
 pip install -U pip setuptools wheel
-pip install signal-grad-cam tensorflow openpyxl pandas PyQt5 pyqtgraph pyqt-svg-button absresgetter scikit-learn matplotlib fextract
+pip install signal-grad-cam tensorflow openpyxl pandas scipy PyQt5 pyqtgraph pyqt-svg-button absresgetter scikit-learn matplotlib fextract
 pip uninstall opencv-python
 pip cache purge
 pip install opencv-python-headless
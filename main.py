@@ -1,14 +1,40 @@
 import os
 import sys
-import Modules.gui as gui
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication
+import argparse
 
+# Spawned worker processes re-import this module, keep Qt and TensorFlow out of it
 if __name__ == "__main__":
+    import Modules.gui as gui
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication
+
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     QApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)
-    app = QApplication(sys.argv)
-    window = gui.App()
+    parser = argparse.ArgumentParser(description="MATE ECG classification GUI.")
+    parser.add_argument(
+        "--diagnostics-backend",
+        choices=("xlsx", "sqlite"),
+        default="xlsx",
+        help="Store diagnostics in Diagnostics.xlsx or in a SQLite database.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("interactive", "batch", "background"),
+        default="interactive",
+        help="TensorFlow thread profile, fixed for the session.",
+    )
+    parser.add_argument(
+        "--no-quality-scan",
+        action="store_true",
+        help="Do not scan recording quality when a directory is added.",
+    )
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = gui.App(
+        diagnostics_backend=args.diagnostics_backend,
+        profile=args.profile,
+        scan_quality=not args.no_quality_scan,
+    )
     # window.showFullScreen()
     window.show()
     sys.exit(app.exec_())